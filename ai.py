@@ -0,0 +1,382 @@
+# ai.py
+# Bộ đánh giá và tìm nước đi cho AI, chạy trên TetrisEngine (không cần pygame).
+import json
+import multiprocessing
+import os
+import time
+from collections import OrderedDict, deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from engine import ROWS, COLS, FULL_ROW, SHAPES, ROTATIONS, Board, drop_y, spawn_position, MOVE_LEFT, MOVE_RIGHT, MOVE_DOWN, ROTATE, DROP
+
+# Trọng số (hàng hoàn thành, tổng chiều cao, số lỗ, độ gồ ghề). Có thể ghi đè bằng file do tune.py tạo ra.
+WEIGHTS = [0.76, 0.51, 0.35, 0.18]
+WEIGHTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "weights.json")
+
+def load_weights(path=WEIGHTS_FILE):
+    # Cập nhật WEIGHTS tại chỗ; giữ nguyên giá trị mặc định nếu không có file
+    if not os.path.exists(path): return False
+    with open(path) as f: WEIGHTS[:] = [float(w) for w in json.load(f)["weights"]]
+    return True
+
+def save_weights(weights, path=WEIGHTS_FILE):
+    with open(path, "w") as f: json.dump({"weights": list(weights)}, f, indent=2)
+
+def evaluate_board(rows):
+    # rows: danh sách bitmask của bảng; quét từ trên xuống một lần để lấy chiều cao cột và số lỗ
+    heights, covered, holes = [ROWS] * COLS, 0, 0
+    for r, mask in enumerate(rows):
+        new = mask & ~covered
+        while new:
+            low = new & -new
+            heights[low.bit_length() - 1] = r
+            new ^= low
+        covered |= mask
+        holes += (covered & ~mask).bit_count()
+    agg_height = sum(ROWS - h for h in heights)
+    completed_lines = rows.count(FULL_ROW)
+    bumpiness = sum(abs(heights[i] - heights[i+1]) for i in range(COLS-1))
+    w = WEIGHTS
+    return completed_lines * w[0] - agg_height * w[1] - holes * w[2] - bumpiness * w[3]
+
+def find_best_move(game):
+    # Trả về (số lần xoay tính từ hướng hiện tại, cột x) của vị trí đặt tốt nhất
+    best_score, best_rotation, best_x = -float('inf'), 0, 0
+    orientations, heights = ROTATIONS[game.piece_key], game.board.heights
+    for r in range(len(orientations)):
+        orientation = orientations[(game.rotation + r) % len(orientations)]
+        for x in orientation.x_range:
+            y = drop_y(game.board, orientation, x, heights=heights)
+            
+            temp_rows = game.board.rows[:]
+            for ty, mask in enumerate(orientation.masks): temp_rows[ty + y] |= mask << x
+            
+            score = evaluate_board(temp_rows)
+            if score > best_score:
+                best_score, best_rotation, best_x = score, r, x
+    return best_rotation, best_x
+
+# --- ĐÁNH GIÁ TĂNG DẦN ---
+# Dùng các đặc trưng Board duy trì sẵn: mỗi vị trí đặt chỉ xét các cột khối chạm tới (và hai cột kề cho bumpiness),
+# nên chi phí mỗi quyết định tăng theo bề rộng khối chứ không theo kích thước bảng.
+def evaluate_placement(board, orientation, x, y):
+    heights, fill, width = board.heights, board.fill, orientation.width
+    completed_lines = sum(1 for dy, n in enumerate(orientation.row_counts) if fill[y + dy] + n == COLS)
+    agg_height, holes = board.agg_height, board.total_holes
+    new_heights = []
+    for c in range(width):
+        old, new = heights[x + c], y + orientation.top[c]
+        new_heights.append(new)
+        agg_height += old - new
+        holes += old - (y + orientation.bottom[c]) - 1 + orientation.gaps[c]
+    bumpiness = board.bumpiness
+    lo, hi = max(x - 1, 0), min(x + width, COLS - 1)
+    for i in range(lo, hi):
+        a = new_heights[i - x] if x <= i < x + width else heights[i]
+        b = new_heights[i + 1 - x] if x <= i + 1 < x + width else heights[i + 1]
+        bumpiness += abs(a - b) - abs(heights[i] - heights[i + 1])
+    w = WEIGHTS
+    return completed_lines * w[0] - agg_height * w[1] - holes * w[2] - bumpiness * w[3]
+
+def find_best_move_incremental(game):
+    best_score, best_rotation, best_x = -float('inf'), 0, 0
+    board, orientations = game.board, ROTATIONS[game.piece_key]
+    heights = board.heights
+    for r in range(len(orientations)):
+        orientation = orientations[(game.rotation + r) % len(orientations)]
+        for x in orientation.x_range:
+            y = min(heights[x + c] - b for c, b in enumerate(orientation.bottom)) - 1
+            if y >= 0: score = evaluate_placement(board, orientation, x, y)
+            else:
+                # Bảng gần đầy, khối chồng lên phần trên cùng: quay về cách đánh giá toàn bảng
+                y = drop_y(board, orientation, x, heights=heights)
+                temp_rows = board.rows[:]
+                for ty, mask in enumerate(orientation.masks): temp_rows[ty + y] |= mask << x
+                score = evaluate_board(temp_rows)
+            if score > best_score:
+                best_score, best_rotation, best_x = score, r, x
+    return best_rotation, best_x
+
+# --- SINH NƯỚC ĐI THEO KHẢ NĂNG TỚI ĐƯỢC ---
+# Duyệt mọi trạng thái (x, y, hướng xoay) mà khối tới được từ vị trí hiện tại bằng đúng các thao tác của engine
+# (trái, phải, xoay tại chỗ, rơi một ô), nên tìm được cả các nước luồn dưới phần nhô ra (tuck) hay xoay kẹt (spin)
+# mà cách "xoay, dịch ngang, thả thẳng" bỏ sót. Mỗi vị trí đặt đi kèm chuỗi thao tác ngắn nhất, kết thúc bằng DROP.
+# y không bao giờ giảm nên mọi đường tới cùng một trạng thái có cùng số lần rơi: chỉ cần đếm trái/phải/xoay
+# (BFS 0-1, bước rơi chi phí 0). Vùng trống phía trên mọi cột được nhảy qua trong một bước thay vì từng hàng.
+Placement = namedtuple('Placement', 'rotation x y actions')
+
+def reachable_placements(board, piece_key, x, y, rotation, deadline=None):
+    # deadline (time.perf_counter): quá hạn thì raise SearchTimeout; kiểm tra ở mỗi trạng thái (một lần đọc đồng hồ,
+    # rẻ hơn nhiều so với các phép thử va chạm của trạng thái đó)
+    orientations = ROTATIONS[piece_key]
+    if board.collides(orientations[rotation].masks, x, y): return ()
+    open_y = min(board.heights) - 4 # Khối ở y <= open_y không chạm ô nào dù ở cột hay hướng xoay nào
+    start = (x, y, rotation)
+    dist, parent, done = {start: 0}, {start: None}, set()
+    queue, best = deque([start]), {}
+    while queue:
+        state = queue.popleft()
+        if state in done: continue
+        done.add(state)
+        if deadline is not None and time.perf_counter() > deadline: raise SearchTimeout
+        sx, sy, sr = state
+        d = dist[state]
+        landing = drop_y(board, orientations[sr], sx, sy)
+        key = (sr, sx, landing)
+        # Ưu tiên ít thao tác, rồi tới ít bước rơi mềm (thả từ vị trí cao hơn)
+        if key not in best or (d, sy) < best[key][:2]: best[key] = (d, sy, state)
+
+        nr = (sr + 1) % len(orientations)
+        edges = [(MOVE_LEFT, (sx - 1, sy, sr), 1), (MOVE_RIGHT, (sx + 1, sy, sr), 1)]
+        if nr != sr: edges.append((ROTATE, (sx, sy, nr), 1))
+        edges.append((MOVE_DOWN, (sx, open_y if sy < open_y else sy + 1, sr), 0))
+        for action, nxt, cost in edges:
+            if nxt in done or dist.get(nxt, float('inf')) <= d + cost: continue
+            if board.collides(orientations[nxt[2]].masks, nxt[0], nxt[1]): continue
+            dist[nxt], parent[nxt] = d + cost, (state, action)
+            if cost: queue.append(nxt)
+            else: queue.appendleft(nxt)
+
+    result = []
+    for (sr, sx, landing), (_, _, state) in best.items():
+        actions = [DROP]
+        while parent[state] is not None:
+            previous, action = parent[state]
+            # Bước nhảy qua vùng trống tương ứng với nhiều lần rơi một ô
+            actions.extend([action] * (state[1] - previous[1] if action == MOVE_DOWN else 1))
+            state = previous
+        result.append(Placement(sr, sx, landing, tuple(reversed(actions))))
+    return tuple(result)
+
+def score_placement(board, orientation, x, y):
+    if y == min(board.heights[x + c] - b for c, b in enumerate(orientation.bottom)) - 1:
+        return evaluate_placement(board, orientation, x, y)
+    # Khối nằm dưới phần nhô ra: công thức tăng dần chỉ đúng với khối đặt trên mặt các cột
+    rows = board.rows[:]
+    for dy, mask in enumerate(orientation.masks): rows[y + dy] |= mask << x
+    return evaluate_board(rows)
+
+# --- TÌM KIẾM NHÌN TRƯỚC NHIỀU KHỐI ---
+# Xét khối hiện tại và next_piece_key (các khối xa hơn chưa biết thì lấy trung bình trên cả 7 loại khối).
+# Mỗi tầng chỉ mở rộng beam_width vị trí tốt nhất theo đánh giá một tầng, kết quả từng thế cờ được
+# lưu trong bảng chuyển vị (khóa theo bitmask bảng), và toàn bộ lượt tìm phải xong trước time_budget giây.
+# Bảng chuyển vị giữ nhỏ (max_cache): trúng rất ít giữa các quyết định, còn vài chục nghìn mục làm mỗi lượt gc
+# toàn phần (chạy giữa một quyết định bất kỳ) tốn thêm nhiều ms.
+class SearchTimeout(Exception): pass
+
+class LookaheadAI:
+    def __init__(self, depth=2, beam_width=4, time_budget=0.004, max_cache=2048):
+        self.depth, self.beam_width, self.time_budget, self.max_cache = depth, beam_width, time_budget, max_cache
+        self.cache = OrderedDict()
+        self.cache_hits, self.timeouts = 0, 0
+
+    def placements(self, board, piece_key, rotation=0, deadline=None):
+        # Các vị trí đặt (điểm, số lần xoay, x, y, orientation), xếp theo điểm giảm dần (giữ thứ tự khi bằng điểm)
+        orientations, heights, result = ROTATIONS[piece_key], board.heights, []
+        for r in range(len(orientations)):
+            if deadline is not None and time.perf_counter() > deadline: raise SearchTimeout
+            orientation = orientations[(rotation + r) % len(orientations)]
+            for x in orientation.x_range:
+                y = min(heights[x + c] - b for c, b in enumerate(orientation.bottom)) - 1
+                if y < 0: continue
+                result.append((evaluate_placement(board, orientation, x, y), r, x, y, orientation))
+        result.sort(key=lambda p: -p[0])
+        return result
+
+    def after(self, board, orientation, x, y):
+        child = board.copy(cells=False)
+        child.place(orientation, x, y, 'X')
+        return child, child.clear_full_rows()
+
+    def value(self, board, piece_key, depth, upcoming, deadline):
+        # Điểm tốt nhất đạt được từ bảng này khi còn `depth` khối để đặt (piece_key=None: khối chưa biết)
+        if time.perf_counter() > deadline: raise SearchTimeout
+        key = (tuple(board.rows), piece_key, depth, upcoming)
+        cached = self.cache.get(key)
+        if cached is not None:
+            self.cache_hits += 1
+            return cached
+        if piece_key is None:
+            result = sum(self.value(board, k, depth, (), deadline) for k in SHAPES) / len(SHAPES)
+        else:
+            candidates = self.placements(board, piece_key, 0, deadline)
+            if not candidates: result = -float('inf')
+            elif depth == 1: result = candidates[0][0]
+            else:
+                result = -float('inf')
+                next_key, rest = (upcoming[0], upcoming[1:]) if upcoming else (None, ())
+                for _, _, x, y, orientation in candidates[:self.beam_width]:
+                    if time.perf_counter() > deadline: raise SearchTimeout
+                    child, lines = self.after(board, orientation, x, y)
+                    result = max(result, lines * WEIGHTS[0] + self.value(child, next_key, depth - 1, rest, deadline))
+        if len(self.cache) >= self.max_cache: self.cache.popitem(last=False)
+        self.cache[key] = result
+        return result
+
+    def find_best_move(self, game):
+        deadline = time.perf_counter() + self.time_budget
+        candidates = self.placements(game.board, game.piece_key, game.rotation)
+        if not candidates or self.depth <= 1: return find_best_move_incremental(game)
+        # Nước tham lam một tầng luôn có sẵn; các ứng viên trong beam chỉ thay thế nó nếu được tìm xong trước hạn
+        best_value, best_move = -float('inf'), candidates[0][1:3]
+        try:
+            for _, r, x, y, orientation in candidates[:self.beam_width]:
+                child, lines = self.after(game.board, orientation, x, y)
+                value = lines * WEIGHTS[0] + self.value(child, game.next_piece_key, self.depth - 1, (), deadline)
+                if value > best_value: best_value, best_move = value, (r, x)
+        except SearchTimeout:
+            self.timeouts += 1
+        return best_move
+
+    def find_best_placement(self, game):
+        # Như find_best_move nhưng tầng gốc xét mọi vị trí tới được từ vị trí hiện tại của khối (kể cả luồn/xoay kẹt);
+        # các tầng sau vẫn chỉ xét thả thẳng cho nhanh. Trả về Placement, None nếu khối không còn chỗ.
+        deadline = time.perf_counter() + self.time_budget
+        orientations, candidates = ROTATIONS[game.piece_key], self.root_placements(game, deadline)
+        if not candidates: return None
+        best_value, best = -float('inf'), candidates[0][1]
+        if self.depth <= 1: return best
+        try:
+            for _, placement in candidates[:self.beam_width]:
+                child, lines = self.after(game.board, orientations[placement.rotation], placement.x, placement.y)
+                value = lines * WEIGHTS[0] + self.value(child, game.next_piece_key, self.depth - 1, (), deadline)
+                if value > best_value: best_value, best = value, placement
+        except SearchTimeout:
+            self.timeouts += 1
+        return best
+
+    def find_best_placements(self, game):
+        # Kế hoạch đoán trước (game.next_piece_key=None): nước tốt nhất cho từng loại khối kế tiếp có thể có, dạng
+        # {khối kế tiếp: Placement}, để lúc khối kế tiếp thật đã biết vẫn chọn theo nó. Cùng số lần gọi value() như
+        # find_best_placement với khối kế tiếp chưa biết (tầng đó vốn tính đủ 7 loại khối rồi lấy trung bình).
+        deadline = time.perf_counter() + self.time_budget
+        orientations, candidates = ROTATIONS[game.piece_key], self.root_placements(game, deadline)
+        if not candidates: return None
+        best = {k: (-float('inf'), candidates[0][1]) for k in SHAPES}
+        if self.depth > 1:
+            try:
+                for _, placement in candidates[:self.beam_width]:
+                    child, lines = self.after(game.board, orientations[placement.rotation], placement.x, placement.y)
+                    for k in SHAPES:
+                        value = lines * WEIGHTS[0] + self.value(child, k, self.depth - 1, (), deadline)
+                        if value > best[k][0]: best[k] = (value, placement)
+            except SearchTimeout:
+                self.timeouts += 1
+        return {k: placement for k, (_, placement) in best.items()}
+
+    def root_placements(self, game, deadline):
+        # Tầng gốc: (điểm, Placement) của mọi vị trí tới được, xếp theo điểm giảm dần.
+        # Duyệt hay chấm điểm vị trí tới được mà quá hạn thì quay về các nước thả thẳng như find_best_move.
+        # Kết quả duyệt không được lưu lại: khóa phải gồm cả bảng, hầu như không bao giờ lặp lại giữa các quyết định.
+        orientations, candidates = ROTATIONS[game.piece_key], []
+        try:
+            for p in reachable_placements(game.board, game.piece_key, game.x, game.y, game.rotation, deadline):
+                if time.perf_counter() > deadline: raise SearchTimeout
+                candidates.append((score_placement(game.board, orientations[p.rotation], p.x, p.y), p))
+        except SearchTimeout:
+            self.timeouts += 1
+            candidates = self.direct_placements(game)
+        candidates.sort(key=lambda c: -c[0])
+        return candidates
+
+    def direct_placements(self, game):
+        # Các nước thả thẳng (xoay tại chỗ, dịch ngang rồi thả) dưới dạng (điểm, Placement)
+        n = len(ROTATIONS[game.piece_key])
+        return [(score, Placement((game.rotation + r) % n, x, y, (ROTATE,) * r + ((MOVE_RIGHT if x > game.x else MOVE_LEFT),) * abs(x - game.x) + (DROP,)))
+                for score, r, x, y, _ in self.placements(game.board, game.piece_key, game.rotation)]
+
+    def find_best_plan(self, game):
+        # Chuỗi thao tác (mã sự kiện của engine) đưa khối tới vị trí tốt nhất, kết thúc bằng DROP
+        placement = self.find_best_placement(game)
+        return placement.actions if placement else (DROP,)
+
+# --- LẬP KẾ HOẠCH TRÊN TIẾN TRÌNH NỀN ---
+# AIPlanner gửi ảnh chụp thế cờ (bitmask bảng, khối, khối kế tiếp, vị trí) sang process pool và trả về Future
+# của Placement, nên vòng lặp vẽ không bao giờ phải chờ tìm kiếm. Mỗi tiến trình con giữ một LookaheadAI
+# (kèm bảng chuyển vị và bộ đệm nước đi) cho từng cấu hình (depth, beam_width, time_budget).
+# next_piece_key=None: khối kế tiếp chưa biết (kế hoạch đoán trước); Future trả về {khối kế tiếp: Placement}
+# (find_best_placements) để bên gọi chọn theo khối kế tiếp thật khi khối này xuất hiện.
+Snapshot = namedtuple('Snapshot', 'board piece_key next_piece_key x y rotation')
+_worker_searches = {}
+
+def plan_snapshot(rows, piece_key, next_piece_key, x, y, rotation, config, weights):
+    # Chạy trong tiến trình con
+    if list(weights) != WEIGHTS:
+        WEIGHTS[:] = weights
+        _worker_searches.clear()
+    search = _worker_searches.get(config)
+    if search is None: search = _worker_searches[config] = LookaheadAI(*config)
+    snapshot = Snapshot(Board(list(rows)), piece_key, next_piece_key, x, y, rotation)
+    return search.find_best_placements(snapshot) if next_piece_key is None else search.find_best_placement(snapshot)
+
+class AIPlanner:
+    def __init__(self, workers=None, depth=2, beam_width=4, time_budget=0.02):
+        # Tìm kiếm không còn chiếm thời gian khung hình nên được dùng ngân sách lớn hơn bản đồng bộ (4 ms)
+        self.config = (depth, beam_width, time_budget)
+        workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        # spawn thay vì fork: tiến trình game đã có cửa sổ SDL và có thể đang có luồng nền (nạp model tay)
+        self.executor = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'))
+        self.submitted = 0
+
+    def submit(self, board, piece_key, next_piece_key, x, y, rotation, config=None):
+        self.submitted += 1
+        return self.executor.submit(plan_snapshot, tuple(board.rows), piece_key, next_piece_key, x, y, rotation,
+                                    config or self.config, tuple(WEIGHTS))
+
+    def shutdown(self): self.executor.shutdown(wait=False, cancel_futures=True)
+
+def predicted_spawn(board, piece_key, placement, next_piece_key):
+    # Bảng sau khi khóa placement và xóa hàng, cùng vị trí xuất hiện của khối kế tiếp; None nếu khi đó thua
+    child = board.copy(cells=False)
+    child.place(ROTATIONS[piece_key][placement.rotation], placement.x, placement.y, 'X')
+    child.clear_full_rows()
+    x, y = spawn_position(next_piece_key)
+    if child.collides(ROTATIONS[next_piece_key][0].masks, x, y): return None
+    return child, x, y
+
+def play_move(game, rotation, x):
+    # Thực hiện ngay một nước đi: xoay, dịch ngang rồi thả thẳng xuống
+    for _ in range(rotation): game.rotate_piece()
+    while game.x < x and game.move(1, 0): pass
+    while game.x > x and game.move(-1, 0): pass
+    return game.hard_drop()
+
+def play_plan(game, actions):
+    # Thực hiện ngay một kế hoạch của find_best_plan(); DROP thả thẳng và khóa khối
+    for action in actions:
+        if action == DROP: return game.hard_drop()
+        game.apply(action)
+    return game.hard_drop()
+
+# --- ĐÁNH GIÁ HÀNG LOẠT BẰNG NUMPY ---
+# Dựng tất cả vị trí đặt thành một mảng (N, ROWS, COLS) rồi tính 4 đặc trưng trong một lượt.
+# Kết quả trùng khớp với find_best_move() (bản vô hướng ở trên được giữ lại làm chuẩn đối chiếu).
+COL_BITS = 1 << np.arange(COLS)
+
+def board_to_array(rows): return (np.array(rows, dtype=np.int64)[:, None] & COL_BITS) != 0
+
+def evaluate_batch(boards):
+    n = len(boards)
+    filled_cols = boards.any(axis=1)
+    heights = np.where(filled_cols, boards.argmax(axis=1), ROWS)
+    agg_height = (ROWS - heights).sum(axis=1)
+    completed_lines = boards.all(axis=2).sum(axis=1)
+    covered = np.logical_or.accumulate(boards, axis=1)
+    holes = (covered & ~boards).reshape(n, -1).sum(axis=1)
+    bumpiness = np.abs(np.diff(heights, axis=1)).sum(axis=1)
+    w = WEIGHTS
+    return completed_lines * w[0] - agg_height * w[1] - holes * w[2] - bumpiness * w[3]
+
+def find_best_move_batch(game):
+    orientations, heights = ROTATIONS[game.piece_key], game.board.heights
+    moves, cand, cell_rows, cell_cols = [], [], [], []
+    for r in range(len(orientations)):
+        orientation = orientations[(game.rotation + r) % len(orientations)]
+        for x in orientation.x_range:
+            y = drop_y(game.board, orientation, x, heights=heights)
+            for dx, dy in orientation.cells:
+                cand.append(len(moves)); cell_rows.append(y + dy); cell_cols.append(x + dx)
+            moves.append((r, x))
+    boards = np.repeat(board_to_array(game.board.rows)[None], len(moves), axis=0)
+    boards[cand, cell_rows, cell_cols] = True
+    return moves[int(np.argmax(evaluate_batch(boards)))]
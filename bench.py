@@ -0,0 +1,313 @@
+# bench.py
+# Bộ đo hiệu năng chạy không cần màn hình (SDL dummy): lõi luật chơi, AI, vẽ bảng và chuỗi nhận diện cử chỉ.
+# Mọi phép đo dùng các thế cờ sinh cố định từ seed nên có thể so giữa các lần chạy / các máy.
+# Kết quả (µs cho mỗi lần gọi, lấy trung vị) ghi ra JSON; --compare đối chiếu với file baseline
+# và báo các mục chậm hơn quá --threshold (thoát với mã 1 nếu có).
+# Ví dụ: python bench.py --output bench_baseline.json
+#        python bench.py --compare bench_baseline.json --video hand.mp4
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+import argparse
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+from engine import ROWS, COLS, FULL_ROW, SHAPES, TetrisEngine, PieceGenerator, check_collision, clear_rows, rotate
+import ai
+
+GROUPS = ('engine', 'ai', 'render', 'gesture', 'filter')
+
+def measure(fn, min_time=0.2, repeats=5):
+    # Thời gian trung vị (µs) của một lần gọi fn; số lần gọi mỗi đợt được nhân đôi tới khi đủ dài để đo
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number): fn()
+        if time.perf_counter() - start >= min_time / repeats: break
+        number *= 2
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for _ in range(number): fn()
+        samples.append((time.perf_counter() - start) / number)
+    return {'us': statistics.median(samples) * 1e6, 'n': number * repeats}
+
+def seeded_games(game_cls=TetrisEngine, count=12, seed=1234):
+    # Thế cờ cố định: AI tham lam chơi 5..60 khối từ PieceGenerator(seed + i)
+    games = []
+    for i in range(count):
+        game = game_cls(generator=PieceGenerator(seed + i))
+        for _ in range(5 + 5 * i):
+            if game.game_over: break
+            ai.play_move(game, *ai.find_best_move_incremental(game))
+        games.append(game)
+    return games
+
+def bench_engine(min_time, seed):
+    games, rng = seeded_games(seed=seed), random.Random(seed)
+    cases = [(game.board, shape, (rng.randrange(COLS - 1), rng.randrange(ROWS - 2))) for game in games for shape in SHAPES.values()]
+    # Bảng có 1-4 hàng đầy ở đáy; mỗi lần đo xóa trên một bản sao
+    full = []
+    for game in games:
+        board = game.board.copy()
+        for y in range(ROWS - 1, ROWS - 1 - rng.randint(1, 4), -1):
+            board.rows[y] = FULL_ROW
+            board.cells[y] = ['X'] * COLS
+        board.rebuild_features()
+        full.append(board)
+    shapes = list(SHAPES.values())
+    return {
+        'engine.check_collision': measure(lambda: [check_collision(b, s, o) for b, s, o in cases], min_time),
+        'engine.board_copy': measure(lambda: [b.copy() for b in full], min_time),
+        'engine.clear_rows': measure(lambda: [clear_rows(b.copy()) for b in full], min_time),
+        'engine.rotate': measure(lambda: [rotate(s) for s in shapes], min_time),
+    }
+
+def bench_ai(min_time, seed):
+    import main # TetrisAI là lớp của game; import main không mở cửa sổ nên nhóm này không cần init_display()
+    games = seeded_games(main.TetrisAI, seed=seed)
+    engines = seeded_games(seed=seed)
+
+    def lookahead():
+        for game in games:
+            game.search.cache.clear() # Đo lượt tìm "nguội", không dùng lại bảng chuyển vị của lần đo trước
+            game.find_best_plan()
+    return {
+        'ai.evaluate_board': measure(lambda: [g.evaluate_board(g.board.rows) for g in games], min_time),
+        'ai.TetrisAI.find_best_plan': measure(lookahead, min_time),
+        'ai.reachable_placements': measure(lambda: [ai.reachable_placements(g.board, g.piece_key, g.x, g.y, g.rotation) for g in engines], min_time),
+        'ai.find_best_move_incremental': measure(lambda: [ai.find_best_move_incremental(g) for g in engines], min_time),
+        'ai.find_best_move_batch': measure(lambda: [ai.find_best_move_batch(g) for g in engines], min_time),
+        'ai.find_best_move': measure(lambda: [ai.find_best_move(g) for g in engines], min_time),
+    }
+
+def bench_render(min_time, seed, particles=3000):
+    import main
+    main.init_display()
+    game = seeded_games(main.Tetris, count=8, seed=seed)[-1]
+    renderer = main.LayeredRenderer(main.win, main.BACKGROUND)
+    state = {'offset': 0.0}
+
+    def keep_particles():
+        # Giữ tải particle nặng: bơm thêm mỗi khi số particle còn sống giảm dưới mức yêu cầu
+        missing = particles - len(game.particles)
+        if missing > 0: game.particles.emit(game.offset_x + main.BOARD_WIDTH / 2, main.BOARD_HEIGHT / 2, (255, 255, 255), missing)
+
+    def full_frame():
+        keep_particles()
+        main.BACKGROUND.draw(main.win, 0)
+        game.draw(main.win, main.TICK)
+
+    def layered_frame():
+        keep_particles()
+        state['offset'] += 0.17 # Nền cuộn như khi chơi: khoảng 1/6 khung hình phải vẽ lại cả màn hình
+        renderer.begin(state['offset'], game.layers())
+        rects = game.draw_dynamic(main.win)
+        game.update_effects(main.TICK)
+        renderer.end(rects)
+
+    def board_layer():
+        game._board_key = None
+        game.layers()
+    return {
+        'render.full_frame': measure(full_frame, min_time),
+        'render.layered_frame': measure(layered_frame, min_time),
+        'render.board_layer': measure(board_layer, min_time),
+    }
+
+def bench_gesture(video, max_frames=300, skip=False, inference_width=None, roi=False):
+    # Cả chuỗi HandTracker + 4 bộ phát hiện, đọc tuần tự từng khung của video (không luồng nền để không bỏ khung);
+    # skip=True: bỏ qua suy luận ở khung đứng yên (MotionGate), như chế độ solo; inference_width/roi như HandTracker
+    from hand_control import HandTracker, MotionGate, MoveDetector, DropDetector, WaveDetector, FingerTapDetector
+    tracker = HandTracker(source=video, threaded=False, inference_width=inference_width, roi=roi, motion_gate=MotionGate() if skip else None)
+    detectors = [MoveDetector(), DropDetector(), WaveDetector(), FingerTapDetector()]
+    frames, stages = [], {'read': [], 'convert': [], 'process': []}
+    try:
+        while len(frames) < max_frames:
+            start = time.perf_counter()
+            if not tracker.update(): break
+            for detector in detectors: detector.detect(tracker)
+            frames.append(time.perf_counter() - start)
+            for stage, values in stages.items(): values.append(tracker.stage_times[stage])
+    finally:
+        tracker.release()
+    if not frames: return {}
+    print(f"gesture: {tracker.frames_inferred} khung suy luận, {tracker.frames_skipped} khung bỏ qua")
+    result = {'gesture.frame': {'us': statistics.median(frames) * 1e6, 'n': len(frames)}}
+    for stage, values in stages.items(): result[f'gesture.{stage}'] = {'us': statistics.median(values) * 1e6, 'n': len(values)}
+    return result
+
+def synthetic_trace(seed, seconds=60, fps=30, size=(640, 480), noise=3):
+    # Vết tay giả lập có nhãn đúng: đứng yên (chỉ rung điểm mốc ±noise px) xen kẽ các cú gạt trái/phải/xuống
+    # theo đường cong mượt, rồi chậm rãi đưa tay về. Trả về (điểm mốc chuẩn hóa, thời điểm, [(khung bắt đầu, khung kết thúc, nhãn)])
+    import numpy as np
+    from hand_control import NUM_LANDMARKS
+    rng = np.random.RandomState(seed)
+    shape = rng.uniform(-50, 50, (NUM_LANDMARKS, 2)) # Dáng tay cố định quanh tâm (px)
+    path, gestures = [], []
+    x, y = size[0] / 2, size[1] / 2 - 40
+
+    def move(dx, dy, duration):
+        nonlocal x, y
+        n = max(int(duration * fps), 1)
+        s = (np.arange(1, n + 1) / n) ** 2 * (3 - 2 * (np.arange(1, n + 1) / n)) # smoothstep
+        path.extend(zip(x + dx * s, y + dy * s))
+        x, y = x + dx, y + dy
+    while len(path) < seconds * fps:
+        move(0, 0, rng.uniform(0.6, 1.5))
+        start, kind = len(path), rng.randint(3)
+        if kind == 2:
+            move(0, rng.uniform(60, 90), rng.uniform(0.2, 0.35))
+            gestures.append((start, len(path), "Drop Down"))
+            move(0, 0, 0.3)
+            move(0, size[1] / 2 - 40 - y, rng.uniform(0.8, 1.2)) # Đưa tay lên lại thật chậm: không phải cử chỉ
+        else:
+            target = rng.uniform(250, 390)
+            if abs(target - x) < 50: target = x + (60 if x < size[0] / 2 else -60)
+            label = "Move Right" if target > x else "Move Left"
+            move(target - x, 0, rng.uniform(0.2, 0.4))
+            gestures.append((start, len(path), label))
+    path = np.array(path)
+    points = np.zeros((len(path), NUM_LANDMARKS, 3))
+    points[:, :, :2] = (path[:, None, :] + shape + rng.normal(0, noise, (len(path), NUM_LANDMARKS, 2))) / size
+    return points, np.arange(len(path)) / fps, gestures
+
+def score_trace(labels, times, gestures, grace=0.3):
+    # Độ trễ (ms, trung bình) từ lúc tay bắt đầu cử chỉ tới lần kích hoạt đúng đầu tiên, số cử chỉ bị bỏ lỡ,
+    # và số lần kích hoạt sai (ngoài mọi cử chỉ, sai hướng, hoặc lặp lại sau lần kích hoạt đúng đầu tiên của cùng cử chỉ)
+    fps = 1 / (times[1] - times[0])
+    expected = {}
+    for start, end, label in gestures:
+        for i in range(start, min(end + int(grace * fps), len(labels))): expected.setdefault(i, (start, label))
+    latencies, hit, false = [], set(), 0
+    for i, label in enumerate(labels):
+        if label not in ("Move Left", "Move Right", "Drop Down"): continue
+        start, want = expected.get(i, (None, None))
+        if label != want or start in hit: false += 1
+        else: hit.add(start); latencies.append((times[i] - times[start]) * 1000)
+    return (statistics.mean(latencies) if latencies else float('nan')), len(gestures) - len(hit), false
+
+def trace_quality(points, times, size, smoother, lead=0.0):
+    # Với vết quay thật (không có nhãn đúng): độ rung = RMS gia tốc từng khung của tâm tay (px),
+    # độ trễ (ms) = τ sao cho tâm đã lọc ≈ tâm thô lùi lại τ (bình phương tối thiểu trên các khung tay đang di chuyển)
+    import numpy as np
+    from hand_control import LandmarkHistory
+    history, raw, smooth = LandmarkHistory(smoother=smoother), [], []
+    for frame_points, t in zip(points, times):
+        history.push(None if np.isnan(frame_points[0, 0]) else frame_points, size[0], size[1], t)
+        if history.get() is None: continue
+        raw.append(history.center()); smooth.append(history.smooth_center(0, lead))
+    raw, smooth = np.array(raw, dtype=float), np.array(smooth)
+    if len(raw) < 10: return float('nan'), float('nan'), float('nan')
+    jitter = lambda p: float(np.sqrt((np.diff(p, 2, axis=0) ** 2).sum(axis=1).mean()))
+    velocity = np.gradient(raw, axis=0) / (times[1] - times[0])
+    moving = np.hypot(*velocity.T) > 100 # px/s
+    if not moving.any(): return jitter(raw), jitter(smooth), float('nan')
+    v, error = velocity[moving], (raw - smooth)[moving]
+    return jitter(raw), jitter(smooth), float((error * v).sum() / (v * v).sum()) * 1000
+
+def bench_filter(min_time, seed, landmarks=None, lead=0.08):
+    # Chi phí của bộ lọc One-Euro mỗi khung, và chất lượng nhận diện trên các vết tay:
+    # so MoveDetector/DropDetector dùng tâm thô với ngưỡng mặc định và với tâm đã lọc + dự đoán ở ngưỡng thấp hơn;
+    # mỗi cử chỉ giả lập chỉ được kích hoạt một lần, các lần lặp lại tính là kích hoạt sai
+    import numpy as np
+    from hand_control import LandmarkHistory, OneEuroFilter, MoveDetector, DropDetector
+    from gesture_batch import run_detectors
+    points, times, gestures = synthetic_trace(seed)
+    size, frames = (640, 480), list(zip(points[:300], times[:300]))
+
+    def filter_all():
+        smoother = OneEuroFilter() # Bộ lọc mới mỗi lượt: thời điểm các khung lặp lại từ đầu
+        for frame_points, t in frames: smoother(frame_points[0, 0], frame_points[0, 1], t)
+
+    def push_all():
+        history = LandmarkHistory()
+        for frame_points, t in frames: history.push(frame_points, size[0], size[1], t)
+    results = {
+        'filter.one_euro': measure(filter_all, min_time),
+        'filter.history_push': measure(push_all, min_time),
+    }
+    for name in results: results[name] = {'us': results[name]['us'] / len(frames), 'n': results[name]['n']} # µs mỗi khung
+
+    configs = [("thô 15/20 (mặc định)", False, 0.0, 15, 20), ("thô 10/12", False, 0.0, 10, 12),
+               ("lọc 10/12", True, 0.0, 10, 12), (f"lọc+dự đoán {lead * 1000:.0f}ms 10/12", True, lead, 10, 12)]
+    print(f"{'synthetic trace':<28}{'trễ ms':>8}{'bỏ lỡ':>7}{'sai':>6}   ({len(gestures)} cử chỉ)")
+    for name, smoothed, config_lead, move_threshold, drop_threshold in configs:
+        detectors = (MoveDetector(move_threshold, smoothed, config_lead), DropDetector(drop_threshold, smoothed=smoothed, lead=config_lead))
+        labels = [m if m.startswith("Move") else d for m, d in run_detectors(points, times, size, detectors, OneEuroFilter())]
+        latency, missed, false = score_trace(labels, times, gestures)
+        print(f"{name:<28}{latency:>8.0f}{missed:>7}{false:>6}")
+    if landmarks:
+        data = np.load(landmarks)
+        trace = data['points'], data['times'], tuple(int(v) for v in data['size'])
+        for config_lead in (0.0, lead):
+            raw_jitter, smooth_jitter, lag = trace_quality(*trace, OneEuroFilter(), config_lead)
+            print(f"{landmarks} (dự đoán {config_lead * 1000:.0f}ms): rung {raw_jitter:.2f} px -> {smooth_jitter:.2f} px, trễ so với tâm thô {lag:.0f} ms")
+    return results
+
+def compare(results, baseline, threshold):
+    # In bảng so sánh, trả về danh sách các mục chậm hơn baseline quá ngưỡng
+    regressions = []
+    print(f"{'benchmark':<32}{'baseline µs':>14}{'now µs':>12}{'ratio':>8}")
+    for name, result in results.items():
+        base = baseline['results'].get(name)
+        if base is None:
+            print(f"{name:<32}{'-':>14}{result['us']:>12.1f}{'':>8}  (mới)")
+            continue
+        ratio = result['us'] / base['us']
+        flag = ""
+        if ratio > 1 + threshold: flag = "  REGRESSION"; regressions.append(name)
+        elif ratio < 1 - threshold: flag = "  faster"
+        print(f"{name:<32}{base['us']:>14.1f}{result['us']:>12.1f}{ratio:>7.2f}x{flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Đo hiệu năng lõi luật chơi, AI, vẽ và nhận diện cử chỉ")
+    parser.add_argument("--only", default=",".join(GROUPS), help="các nhóm cần đo, cách nhau bởi dấu phẩy: " + ", ".join(GROUPS))
+    parser.add_argument("--output", metavar="FILE", help="ghi kết quả ra FILE (JSON)")
+    parser.add_argument("--compare", metavar="BASELINE", help="so với file kết quả trước đó và báo các mục chậm đi")
+    parser.add_argument("--threshold", type=float, default=0.15, help="tỉ lệ chậm đi tối đa trước khi coi là regression")
+    parser.add_argument("--video", metavar="PATH", help="video tay quay sẵn cho nhóm gesture (bỏ qua nhóm này nếu không có)")
+    parser.add_argument("--video-frames", type=int, default=300, help="số khung hình tối đa đọc từ video")
+    parser.add_argument("--skip-static", action="store_true", help="nhóm gesture: bỏ qua suy luận khi khung hình đứng yên")
+    parser.add_argument("--inference-width", type=int, metavar="N", help="nhóm gesture: thu nhỏ ảnh về bề rộng N px trước khi suy luận")
+    parser.add_argument("--roi", action="store_true", help="nhóm gesture: chỉ suy luận quanh bàn tay ở khung trước")
+    parser.add_argument("--landmarks", metavar="FILE", help="vết tay quay thật (.npz từ gesture_batch.py --save-landmarks) cho nhóm filter")
+    parser.add_argument("--lead", type=float, default=0.08, help="thời gian dự đoán (giây) của bộ lọc trong nhóm filter")
+    parser.add_argument("--min-time", type=float, default=0.2, help="thời gian đo tối thiểu cho mỗi mục (giây)")
+    parser.add_argument("--seed", type=int, default=1234, help="seed sinh các thế cờ cố định")
+    args = parser.parse_args()
+
+    groups = [g.strip() for g in args.only.split(",") if g.strip()]
+    results = {}
+    for group in groups:
+        start = time.perf_counter()
+        if group == 'engine': results.update(bench_engine(args.min_time, args.seed))
+        elif group == 'ai': results.update(bench_ai(args.min_time, args.seed))
+        elif group == 'render': results.update(bench_render(args.min_time, args.seed))
+        elif group == 'gesture':
+            if not args.video:
+                print("gesture: bỏ qua (cần --video)")
+                continue
+            results.update(bench_gesture(args.video, args.video_frames, args.skip_static, args.inference_width, args.roi))
+        elif group == 'filter': results.update(bench_filter(args.min_time, args.seed, args.landmarks, args.lead))
+        else: parser.error(f"nhóm không hợp lệ: {group}")
+        print(f"{group}: xong sau {time.perf_counter() - start:.1f}s")
+
+    for name, result in results.items(): print(f"{name:<32}{result['us']:>12.1f} µs  (n={result['n']})")
+    report = {'meta': {'python': sys.version.split()[0], 'platform': platform.platform(), 'time': time.strftime("%Y-%m-%d %H:%M:%S"), 'seed': args.seed},
+              'results': results}
+    if args.output:
+        with open(args.output, "w") as f: json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f: baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
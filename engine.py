@@ -0,0 +1,258 @@
+# engine.py
+# Lõi luật chơi Tetris thuần logic (không import pygame) để chạy mô phỏng không cần màn hình.
+import random
+from collections import namedtuple
+from functools import lru_cache
+
+ROWS, COLS = 20, 10
+SHAPES = { 'I': ((1, 1, 1, 1),), 'O': ((1, 1), (1, 1)), 'T': ((0, 1, 0), (1, 1, 1)), 'S': ((0, 1, 1), (1, 1, 0)), 'Z': ((1, 1, 0), (0, 1, 1)), 'J': ((1, 0, 0), (1, 1, 1)), 'L': ((0, 0, 1), (1, 1, 1)) }
+
+# --- BITBOARD ---
+# Mỗi hàng của bảng là một số nguyên bitmask (bit x = cột x), màu khối được lưu riêng trong bảng phụ `cells`.
+FULL_ROW = (1 << COLS) - 1
+
+@lru_cache(maxsize=None)
+def shape_masks(shape): return tuple(sum(1 << x for x, val in enumerate(row) if val) for row in shape)
+
+class Board:
+    # Ngoài bitmask, bảng còn duy trì các đặc trưng cho AI, cập nhật dần khi đặt khối và xóa hàng:
+    #   heights[c]: chỉ số hàng cao nhất có khối của cột c (ROWS nếu cột trống)
+    #   holes[c]:   số ô trống nằm dưới đỉnh cột c
+    #   fill[r]:    số ô đã lấp của hàng r
+    # cùng các tổng agg_height, total_holes, bumpiness.
+    __slots__ = ('rows', 'cells', 'heights', 'holes', 'fill', 'agg_height', 'total_holes', 'bumpiness')
+    def __init__(self, rows=None, cells=None):
+        self.rows = rows if rows is not None else [0] * ROWS
+        self.cells = cells if cells is not None else [[0] * COLS for _ in range(ROWS)]
+        self.rebuild_features()
+
+    # Giữ tương thích với cách truy cập cũ board[y][x]
+    def __getitem__(self, y): return self.cells[y]
+    def __iter__(self): return iter(self.cells)
+    def __len__(self): return ROWS
+
+    def copy(self, cells=True):
+        # cells=False: bản sao chỉ phục vụ tìm kiếm của AI, bỏ qua bảng màu cho nhanh
+        board = Board.__new__(Board)
+        board.rows = self.rows[:]
+        board.cells = [row[:] for row in self.cells] if cells and self.cells is not None else None
+        board.heights, board.holes, board.fill = self.heights[:], self.holes[:], self.fill[:]
+        board.agg_height, board.total_holes, board.bumpiness = self.agg_height, self.total_holes, self.bumpiness
+        return board
+
+    def rebuild_features(self):
+        # Tính lại toàn bộ đặc trưng từ bitmask (dùng khi dựng bảng từ dữ liệu có sẵn)
+        self.heights, self.holes = [ROWS] * COLS, [0] * COLS
+        covered = 0
+        for r, mask in enumerate(self.rows):
+            new = mask & ~covered
+            while new:
+                low = new & -new
+                self.heights[low.bit_length() - 1] = r
+                new ^= low
+            covered |= mask
+            gaps = covered & ~mask
+            while gaps:
+                low = gaps & -gaps
+                self.holes[low.bit_length() - 1] += 1
+                gaps ^= low
+        self.fill = [mask.bit_count() for mask in self.rows]
+        self.update_totals()
+
+    def update_totals(self):
+        heights = self.heights
+        self.agg_height = ROWS * COLS - sum(heights)
+        self.total_holes = sum(self.holes)
+        self.bumpiness = sum(abs(heights[i] - heights[i+1]) for i in range(COLS-1))
+
+    def collides(self, masks, x, y):
+        if x < 0: return True
+        rows = self.rows
+        for dy, mask in enumerate(masks):
+            mask <<= x
+            if mask > FULL_ROW or y + dy >= ROWS or (y + dy >= 0 and rows[y + dy] & mask): return True
+        return False
+
+    def place(self, orientation, x, y, key):
+        for dy, mask in enumerate(orientation.masks):
+            if y + dy >= 0:
+                self.rows[y + dy] |= mask << x
+                self.fill[y + dy] += orientation.row_counts[dy]
+        # Duyệt các ô từ dưới lên: ô nằm dưới đỉnh cột lấp một lỗ, ô nằm trên đỉnh tạo thêm lỗ ở khoảng trống bên dưới
+        for dx, dy in reversed(orientation.cells):
+            if y + dy < 0: continue
+            c, r = x + dx, y + dy
+            if self.cells is not None: self.cells[r][c] = key
+            if r > self.heights[c]: self.holes[c] -= 1
+            else:
+                self.holes[c] += self.heights[c] - r - 1
+                self.heights[c] = r
+        self.update_totals()
+
+    def full_rows(self): return [y for y, mask in enumerate(self.rows) if mask == FULL_ROW]
+
+    def clear_full_rows(self):
+        keep = [y for y, mask in enumerate(self.rows) if mask != FULL_ROW]
+        cleared = ROWS - len(keep)
+        if not cleared: return 0
+        # Hàng đầy luôn nằm dưới đỉnh mọi cột và không chứa lỗ, nên chỉ những cột có đỉnh nằm
+        # trên một hàng bị xóa mới phải dò tiếp xuống tìm đỉnh mới (các lỗ phía trên đỉnh mới biến mất).
+        rows = self.rows
+        for c in range(COLS):
+            top = self.heights[c]
+            if top == ROWS: continue
+            if rows[top] != FULL_ROW:
+                self.heights[c] = top + cleared
+                continue
+            bit, r = 1 << c, top + 1
+            while r < ROWS and (rows[r] == FULL_ROW or not rows[r] & bit):
+                if rows[r] != FULL_ROW: self.holes[c] -= 1
+                r += 1
+            self.heights[c] = r + sum(1 for y in range(r + 1, ROWS) if rows[y] == FULL_ROW) if r < ROWS else ROWS
+        self.rows = [0] * cleared + [rows[y] for y in keep]
+        if self.cells is not None: self.cells = [[0] * COLS for _ in range(cleared)] + [self.cells[y] for y in keep]
+        self.fill = [0] * cleared + [self.fill[y] for y in keep]
+        self.update_totals()
+        return cleared
+
+# --- CÁC HÀM TIỆN ÍCH ---
+def rotate(shape): return tuple(row[::-1] for row in zip(*shape))
+def check_collision(board, shape, offset): return board.collides(shape_masks(shape), *offset)
+def clear_rows(board): return board.clear_full_rows()
+
+# --- BẢNG XOAY TÍNH SẴN ---
+# Mỗi khối chỉ giữ các hướng xoay khác nhau (O: 1, I/S/Z: 2, còn lại: 4), theo đúng thứ tự của rotate().
+# top[c]/bottom[c] là hàng cao nhất/thấp nhất có ô của khối tại cột c, gaps[c] là số ô trống kẹp giữa chúng,
+# row_counts[dy] là số ô của khối trên hàng dy, x_range là các vị trí x hợp lệ.
+Orientation = namedtuple('Orientation', 'shape masks cells width height top bottom gaps row_counts x_range')
+
+def build_orientations(shape):
+    orientations = []
+    while all(o.shape != shape for o in orientations):
+        cells = tuple((x, y) for y, row in enumerate(shape) for x, val in enumerate(row) if val)
+        width = len(shape[0])
+        top = tuple(min(y for x, y in cells if x == c) for c in range(width))
+        bottom = tuple(max(y for x, y in cells if x == c) for c in range(width))
+        gaps = tuple(bottom[c] - top[c] + 1 - sum(1 for x, y in cells if x == c) for c in range(width))
+        row_counts = tuple(sum(row) for row in shape)
+        orientations.append(Orientation(shape, shape_masks(shape), cells, width, len(shape), top, bottom, gaps, row_counts, range(COLS - width + 1)))
+        shape = rotate(shape)
+    return tuple(orientations)
+
+ROTATIONS = {key: build_orientations(shape) for key, shape in SHAPES.items()}
+
+def spawn_position(piece_key):
+    # Vị trí (x, y) khối mới xuất hiện, ở hướng xoay 0
+    return COLS // 2 - ROTATIONS[piece_key][0].width // 2, 0
+
+def drop_y(board, orientation, x, y=0, heights=None):
+    # Khi khối nằm hoàn toàn trên mặt các cột thì vị trí rơi lấy thẳng từ chiều cao cột,
+    # ngược lại (khối đang nằm dưới phần nhô ra) thì mới dò từng hàng.
+    if heights is None: heights = board.heights
+    landing = min(heights[x + c] - b for c, b in enumerate(orientation.bottom)) - 1
+    if landing >= y: return landing
+    while not board.collides(orientation.masks, x, y + 1): y += 1
+    return y
+
+# --- BỘ SINH KHỐI ---
+# 'uniform': mỗi khối chọn ngẫu nhiên độc lập (như bản gốc); 'bag': xáo túi 7 khối, phát hết túi rồi xáo túi mới.
+# Cùng seed và mode luôn cho cùng một dãy khối, nên ván chơi có thể phát lại được.
+PIECE_KEYS = tuple(SHAPES)
+
+class PieceGenerator:
+    def __init__(self, seed=None, mode='uniform'):
+        if mode not in ('uniform', 'bag'): raise ValueError(f"Unknown piece generator mode: {mode}")
+        self.seed = random.randrange(2**32) if seed is None else seed
+        self.mode = mode
+        self.rng = random.Random(self.seed)
+        self.bag = []
+
+    def next(self):
+        if self.mode == 'uniform': return self.rng.choice(PIECE_KEYS)
+        if not self.bag:
+            self.bag = list(PIECE_KEYS)
+            self.rng.shuffle(self.bag)
+        return self.bag.pop()
+
+# --- LUẬT CHƠI ---
+# Mã các sự kiện làm thay đổi trạng thái ván chơi, dùng cho ghi/phát lại (replay.py).
+# Chỉ các thao tác thành công mới được ghi, vì thao tác thất bại không đổi trạng thái.
+MOVE_LEFT, MOVE_RIGHT, MOVE_DOWN, ROTATE, DROP, LOCK = range(6)
+MOVE_ACTIONS = {(-1, 0): MOVE_LEFT, (1, 0): MOVE_RIGHT, (0, 1): MOVE_DOWN}
+
+class TetrisEngine:
+    def __init__(self, generator=None, recorder=None):
+        self.generator = generator or PieceGenerator()
+        self.recorder = recorder
+        self.board = Board()
+        self.score, self.lines, self.pieces = 0, 0, 0
+        self.frame = 0
+        self.game_over = False
+        self.spawn_piece()
+
+    def tick(self):
+        # Gọi mỗi khung hình để bản ghi lưu được khoảng cách giữa các sự kiện
+        self.frame += 1
+
+    def record(self, action):
+        if self.recorder is not None: self.recorder.record(self.frame, action)
+
+    def spawn_piece(self):
+        if not hasattr(self, 'next_piece_key'): self.next_piece_key = self.generator.next()
+        self.piece_key, self.next_piece_key = self.next_piece_key, self.generator.next()
+        self.set_rotation(0)
+        self.x, self.y = spawn_position(self.piece_key)
+        if self.board.collides(self.orientation.masks, self.x, self.y): self.game_over = True
+
+    def set_rotation(self, rotation):
+        self.rotation = rotation
+        self.orientation = ROTATIONS[self.piece_key][rotation]
+        self.shape = self.orientation.shape
+
+    def move(self, dx, dy):
+        if not self.game_over and not self.board.collides(self.orientation.masks, self.x + dx, self.y + dy):
+            self.x, self.y = self.x + dx, self.y + dy
+            self.record(MOVE_ACTIONS[dx, dy])
+            return True
+        return False
+
+    def rotate_piece(self):
+        if self.game_over: return
+        rotation = (self.rotation + 1) % len(ROTATIONS[self.piece_key])
+        if not self.board.collides(ROTATIONS[self.piece_key][rotation].masks, self.x, self.y):
+            self.set_rotation(rotation)
+            self.record(ROTATE)
+
+    def lock_piece(self):
+        # Trả về danh sách các hàng vừa xóa để lớp vẽ tạo hiệu ứng
+        self.record(LOCK)
+        self.board.place(self.orientation, self.x, self.y, self.piece_key)
+        self.pieces += 1
+
+        rows_to_clear = self.board.full_rows()
+        if rows_to_clear:
+            cleared = clear_rows(self.board)
+            self.score += cleared * 100 * cleared
+            self.lines += cleared
+
+        if not self.game_over: self.spawn_piece()
+        return rows_to_clear
+
+    def hard_drop(self):
+        if self.game_over: return []
+        self.y = drop_y(self.board, self.orientation, self.x, self.y)
+        self.record(DROP)
+        return self.lock_piece()
+
+    def update(self):
+        if not self.game_over and not self.move(0, 1): self.lock_piece()
+
+    def apply(self, action):
+        # Thực hiện lại một sự kiện đã ghi
+        if action == MOVE_LEFT: self.move(-1, 0)
+        elif action == MOVE_RIGHT: self.move(1, 0)
+        elif action == MOVE_DOWN: self.move(0, 1)
+        elif action == ROTATE: self.rotate_piece()
+        elif action == DROP: self.y = drop_y(self.board, self.orientation, self.x, self.y)
+        elif action == LOCK: self.lock_piece()
+        else: raise ValueError(f"Unknown replay action: {action}")
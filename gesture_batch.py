@@ -0,0 +1,144 @@
+# gesture_batch.py
+# Nhận diện cử chỉ offline trên video quay sẵn hoặc thư mục ảnh, không cần webcam hay màn hình.
+# Đoạn quay được chia thành nhiều phần chạy MediaPipe song song trên process pool (mỗi tiến trình một model);
+# mỗi phần bắt đầu sớm hơn --overlap khung để chế độ theo dõi của MediaPipe kịp bắt tay, các khung chồng lấn bị bỏ.
+# 4 bộ phát hiện sau đó chạy tuần tự trên điểm mốc đã gộp (rất nhanh), nên nhãn không phụ thuộc cách chia phần,
+# và có thể dò lại ngưỡng nhiều lần trên file điểm mốc đã lưu (--save-landmarks / --landmarks) mà không chạy MediaPipe.
+# Ví dụ: python gesture_batch.py hand.mp4 --workers 4 --output labels.csv --save-landmarks hand.npz
+#        python gesture_batch.py --landmarks hand.npz --move-threshold 20 --wave-threshold 60 --tap-ready 0.1
+import argparse
+import csv
+import os
+import time
+from collections import Counter
+from multiprocessing import Pool
+import numpy as np
+from hand_control import NUM_LANDMARKS, FrameSource, HandTracker, LandmarkHistory, MotionGate, OneEuroFilter, MoveDetector, DropDetector, WaveDetector, FingerTapDetector
+
+LABELS = ('movement', 'drop', 'wave', 'tap')
+
+def process_chunk(task):
+    # Chạy trong tiến trình con: trả về điểm mốc chuẩn hóa (NaN nếu không thấy tay) của các khung [start, stop)
+    # stop None: không biết số khung, đọc tới hết nguồn
+    source, start, stop, overlap, fps, inference_width, roi, motion_threshold = task
+    began = time.perf_counter()
+    gate = None if motion_threshold is None else MotionGate(motion_threshold)
+    tracker = HandTracker(FrameSource(source, fps, max(start - overlap, 0), stop), threaded=False, inference_width=inference_width, roi=roi, motion_gate=gate)
+    rows, size, processed = [], (0, 0), 0 # rows: (vị trí trong phần, điểm mốc chuẩn hóa hoặc None, thời điểm)
+    try:
+        while tracker.update():
+            processed += 1
+            index = tracker.cap.index - 1
+            size = (tracker.frame_width, tracker.frame_height)
+            if index < start: continue
+            landmarks = tracker.history.get()
+            rows.append((index - start, None if landmarks is None else landmarks / (tracker.frame_width, tracker.frame_height, 1), tracker.timestamp))
+    finally:
+        tracker.release()
+    length = stop - start if stop is not None else rows[-1][0] + 1 if rows else 0
+    points, times = np.full((length, NUM_LANDMARKS, 3), np.nan), np.arange(start, start + length) / tracker.cap.fps
+    for i, landmarks, t in rows:
+        times[i] = t
+        if landmarks is not None: points[i] = landmarks
+    return start, points, times, size, processed, tracker.frames_skipped, time.perf_counter() - began
+
+def extract_landmarks(source, workers, chunk, overlap, fps=None, inference_width=None, roi=False, motion_threshold=None):
+    probe = FrameSource(source, fps)
+    total, fps = probe.count, probe.fps
+    probe.release()
+    if total is None:
+        # Không biết số khung thì không chia phần được: đọc tuần tự cả file trong tiến trình này
+        _, points, times, size, processed, skipped, busy = process_chunk((source, 0, None, 0, fps, inference_width, roi, motion_threshold))
+        return points, times, size, processed, skipped, busy
+    tasks = [(source, s, min(s + chunk, total), overlap, fps, inference_width, roi, motion_threshold) for s in range(0, total, chunk)]
+    points, times = np.full((total, NUM_LANDMARKS, 3), np.nan), np.zeros(total)
+    size, processed, skipped, busy = (0, 0), 0, 0, 0.0
+    with Pool(workers) as pool:
+        for start, chunk_points, chunk_times, chunk_size, chunk_processed, chunk_skipped, elapsed in pool.imap_unordered(process_chunk, tasks):
+            points[start:start + len(chunk_points)], times[start:start + len(chunk_times)] = chunk_points, chunk_times
+            size, processed, skipped, busy = max(size, chunk_size), processed + chunk_processed, skipped + chunk_skipped, busy + elapsed
+    return points, times, size, processed, skipped, busy
+
+class LandmarkReplay:
+    # Thay HandTracker cho các bộ phát hiện: chỉ cần history và kích thước khung hình
+    def __init__(self, width, height, smoother=None):
+        self.frame_width, self.frame_height = width, height
+        self.history = LandmarkHistory(smoother=smoother)
+
+def given(**kwargs):
+    # Chỉ các tham số được đặt trên dòng lệnh; None: giữ giá trị mặc định của bộ phát hiện
+    return {name: value for name, value in kwargs.items() if value is not None}
+
+def make_detectors(args):
+    return (MoveDetector(smoothed=args.smooth, lead=args.lead, **given(move_threshold=args.move_threshold)),
+            DropDetector(smoothed=args.smooth, lead=args.lead, **given(move_threshold=args.drop_threshold)),
+            WaveDetector(**given(wave_threshold=args.wave_threshold)),
+            FingerTapDetector(**given(ready_threshold=args.tap_ready, cooldown=args.tap_cooldown)))
+
+def run_detectors(points, times, size, detectors, smoother=None):
+    # Nhãn từng khung (movement, drop, wave, tap) theo đúng thứ tự khung hình
+    replay = LandmarkReplay(*size, smoother)
+    labels = []
+    for frame_points, t in zip(points, times):
+        replay.history.push(None if np.isnan(frame_points[0, 0]) else frame_points, size[0], size[1], t)
+        labels.append(tuple(detector.detect(replay) for detector in detectors))
+    return labels
+
+def main():
+    parser = argparse.ArgumentParser(description="Nhận diện cử chỉ offline trên video/thư mục ảnh bằng process pool")
+    parser.add_argument("source", nargs="?", help="file video hoặc thư mục ảnh")
+    parser.add_argument("--landmarks", metavar="FILE", help="dùng điểm mốc đã lưu (.npz) thay vì chạy MediaPipe")
+    parser.add_argument("--save-landmarks", metavar="FILE", help="lưu điểm mốc ra FILE (.npz) để dò ngưỡng lại sau")
+    parser.add_argument("--output", metavar="FILE", help="ghi nhãn từng khung ra FILE (CSV)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--chunk", type=int, default=300, help="số khung hình mỗi phần")
+    parser.add_argument("--overlap", type=int, default=15, help="số khung chạy trước mỗi phần để MediaPipe bắt kịp tay")
+    parser.add_argument("--fps", type=float, default=None, help="fps của nguồn (mặc định: lấy từ video, 30 với thư mục ảnh)")
+    parser.add_argument("--motion-threshold", type=float, default=None, help="bỏ qua suy luận khi khung đứng yên (MotionGate.threshold, mức xám); so nhãn với lần chạy không bỏ qua để dò")
+    parser.add_argument("--inference-width", type=int, default=None, help="thu nhỏ ảnh trước khi đưa vào MediaPipe")
+    parser.add_argument("--roi", action="store_true", help="chỉ suy luận trên vùng quanh bàn tay ở khung trước (HandTracker roi)")
+    parser.add_argument("--move-threshold", type=float, default=None, help="MoveDetector.MOVE_THRESHOLD (px)")
+    parser.add_argument("--drop-threshold", type=float, default=None, help="DropDetector.MOVE_THRESHOLD (px)")
+    parser.add_argument("--wave-threshold", type=float, default=None, help="WaveDetector.WAVE_THRESHOLD (px mỗi khung)")
+    parser.add_argument("--tap-ready", type=float, default=None, help="FingerTapDetector.ready_threshold (giây)")
+    parser.add_argument("--tap-cooldown", type=float, default=None, help="FingerTapDetector.cooldown (giây)")
+    parser.add_argument("--smooth", action="store_true", help="MoveDetector/DropDetector dùng tâm bàn tay đã lọc One-Euro")
+    parser.add_argument("--lead", type=float, default=0.0, help="dự đoán vị trí trước bao nhiêu giây (cùng --smooth)")
+    parser.add_argument("--min-cutoff", type=float, default=None, help="OneEuroFilter.min_cutoff (Hz)")
+    parser.add_argument("--beta", type=float, default=None, help="OneEuroFilter.beta")
+    args = parser.parse_args()
+    if not args.source and not args.landmarks: parser.error("cần source hoặc --landmarks")
+
+    if args.landmarks:
+        data = np.load(args.landmarks)
+        points, times, size = data['points'], data['times'], tuple(int(v) for v in data['size'])
+    else:
+        start = time.perf_counter()
+        points, times, size, processed, skipped, busy = extract_landmarks(args.source, args.workers, args.chunk, args.overlap, args.fps,
+                                                                          args.inference_width, args.roi, args.motion_threshold)
+        elapsed = time.perf_counter() - start
+        print(f"{len(points)} frames ({processed - len(points)} overlap) in {elapsed:.2f}s: {len(points) / elapsed:.1f} frames/sec "
+              f"with {args.workers} workers ({processed / busy if busy else 0:.1f} frames/sec per worker)")
+        if args.motion_threshold is not None and processed: print(f"inference: {processed - skipped} frames, skipped {skipped} ({skipped / processed:.0%})")
+        if args.save_landmarks: np.savez_compressed(args.save_landmarks, points=points, times=times, size=size)
+
+    start = time.perf_counter()
+    smoother = OneEuroFilter()
+    if args.min_cutoff is not None: smoother.min_cutoff = args.min_cutoff
+    if args.beta is not None: smoother.beta = args.beta
+    labels = run_detectors(points, times, size, make_detectors(args), smoother)
+    elapsed = time.perf_counter() - start
+    hands = int((~np.isnan(points[:, 0, 0])).sum())
+    print(f"detectors: {len(labels)} frames in {elapsed * 1000:.0f} ms, hand in {hands} frames")
+    for i, name in enumerate(LABELS):
+        counts = Counter(label[i] for label in labels if label[i] not in ("None", "", "In Box", "Outside Box"))
+        print(f"  {name:<9} " + (", ".join(f"{k}: {v}" for k, v in counts.items()) or "-"))
+    if args.output:
+        with open(args.output, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(('frame', 'time', 'hand') + LABELS)
+            for i, (t, label) in enumerate(zip(times, labels)):
+                writer.writerow([i, f"{t:.4f}", int(not np.isnan(points[i, 0, 0]))] + list(label))
+
+if __name__ == "__main__":
+    main()
@@ -1,106 +1,465 @@
 # File: hand_control.py
 # XÓA TẤT CẢ MÃ CŨ VÀ DÁN MÃ MỚI NÀY VÀO
 
-import cv2
-import mediapipe as mp
+import os
+import numpy as np
 import math
-import pygame # Cần pygame để tạo debug surface và lấy thời gian
+import threading
+import time
+import pygame # Cần pygame để tạo debug surface
+from render import render_text, text_cache
+
+# cv2 và MediaPipe nạp chậm (vài trăm ms tới vài giây kể cả dựng model), nên chỉ nạp khi HandTracker đầu tiên
+# được tạo hoặc khi warm_up() chạy trên luồng nền (ví dụ lúc đang ở menu). Model vẫn được khởi tạo một lần và dùng chung.
+cv2, mp_hands, hands = None, None, None
+hands_load_time = None # Thời gian (giây) nạp cv2 + MediaPipe + dựng model
+_load_lock = threading.Lock()
+
+def load_cv2():
+    global cv2
+    if cv2 is None:
+        import cv2 as cv
+        cv2 = cv
+    return cv2
+
+def load_hands():
+    global mp_hands, hands, hands_load_time
+    with _load_lock: # Gọi cùng lúc với warm_up() thì chờ lượt nạp đang chạy thay vì nạp lần hai
+        if hands is None:
+            start = time.perf_counter()
+            load_cv2()
+            import mediapipe as mp
+            mp_hands = mp.solutions.hands
+            hands = mp_hands.Hands(
+                max_num_hands=1,
+                min_detection_confidence=0.7,
+                min_tracking_confidence=0.5
+            )
+            hands_load_time = time.perf_counter() - start
+    return hands
+
+def warm_up():
+    # Nạp model trên luồng nền; HandTracker tạo sau đó chỉ chờ phần còn lại (nếu có)
+    thread = threading.Thread(target=load_hands, name="HandWarmUp", daemon=True)
+    thread.start()
+    return thread
+
+def update_fps(fps, dt, smoothing=0.9):
+    # Trung bình trượt của FPS để số hiển thị không nhảy liên tục
+    if dt <= 0: return fps
+    return 1.0 / dt if fps == 0 else fps * smoothing + (1.0 / dt) * (1 - smoothing)
+
+NUM_LANDMARKS = 21
+WRIST, INDEX_PIP, INDEX_TIP = 0, 6, 8
+
+def landmarks_to_array(hand_landmarks):
+    # Chuyển 21 điểm mốc của MediaPipe thành mảng (21, 3) tọa độ chuẩn hóa, chỉ một lần mỗi khung hình
+    return np.array([(lm.x, lm.y, lm.z) for lm in hand_landmarks.landmark], dtype=np.float64)
+
+def landmark_box(points, pad=20):
+    # Khung bao (min_x, min_y, max_x, max_y) quanh các điểm mốc (tọa độ pixel), nới thêm pad
+    xs, ys = points[:, 0], points[:, 1]
+    return int(xs.min()) - pad, int(ys.min()) - pad, int(xs.max()) + pad, int(ys.max()) + pad
+
+class OneEuroFilter:
+    # Bộ lọc One-Euro (Casiez và cộng sự, CHI 2012) cho một vị trí 2D theo thời gian chụp:
+    # tần số cắt tăng theo tốc độ, nên tay đứng yên thì rung ít còn tay di chuyển nhanh thì ít bị trễ.
+    # min_cutoff (Hz): nhỏ hơn = mượt hơn khi đứng yên; beta: lớn hơn = bớt trễ khi nhanh; d_cutoff (Hz): lọc vận tốc.
+    # Vận tốc (px/s) đã lọc dùng để dự đoán vị trí sau `lead` giây, bù một phần độ trễ của camera + suy luận.
+    def __init__(self, min_cutoff=1.0, beta=0.02, d_cutoff=1.0):
+        self.min_cutoff, self.beta, self.d_cutoff = min_cutoff, beta, d_cutoff
+        self.reset()
+
+    def reset(self):
+        self.value, self.velocity, self.time = None, None, None
+
+    @staticmethod
+    def _alpha(cutoff, dt):
+        return 1 / (1 + 1 / (2 * math.pi * cutoff * dt))
+
+    def __call__(self, x, y, timestamp):
+        # Số thực thuần thay vì mảng numpy 2 phần tử: nhanh hơn vài lần cho một điểm mỗi khung
+        if self.value is None:
+            self.value, self.velocity, self.time = (x, y), (0.0, 0.0), timestamp
+            return self.value
+        dt = timestamp - self.time
+        if dt <= 0: return self.value
+        (sx, sy), (vx, vy) = self.value, self.velocity
+        a = self._alpha(self.d_cutoff, dt)
+        vx, vy = vx + a * ((x - sx) / dt - vx), vy + a * ((y - sy) / dt - vy)
+        a = self._alpha(self.min_cutoff + self.beta * math.hypot(vx, vy), dt)
+        self.value, self.velocity, self.time = (sx + a * (x - sx), sy + a * (y - sy)), (vx, vy), timestamp
+        return self.value
+
+class LandmarkHistory:
+    # Bộ đệm vòng cấp phát sẵn chứa điểm mốc (pixel) của `capacity` khung gần nhất kèm thời điểm chụp.
+    # Mọi bộ phát hiện cử chỉ đọc chung từ đây; age=0 là khung mới nhất, age=1 là khung trước đó...
+    # Tâm khung bao còn được lọc qua `smoother` (mặc định OneEuroFilter), đọc bằng smooth_center/smooth_velocity.
+    def __init__(self, capacity=32, pad=20, smoother=None):
+        self.points = np.zeros((capacity, NUM_LANDMARKS, 3))
+        self.boxes = np.zeros((capacity, 4), dtype=np.int64)
+        self.times = np.zeros(capacity)
+        self.valid = np.zeros(capacity, dtype=bool)
+        self.smoothed, self.smoothed_velocity = np.zeros((capacity, 2)), np.zeros((capacity, 2))
+        self.smoother = smoother or OneEuroFilter()
+        self.capacity, self.pad = capacity, pad
+        self.index, self.count = -1, 0
+
+    def push(self, landmarks, width, height, timestamp):
+        i = self.index = (self.index + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+        self.times[i] = timestamp
+        self.valid[i] = landmarks is not None
+        if landmarks is None:
+            self.smoother.reset() # Mất tay: lần xuất hiện sau bắt đầu lại, không kéo theo vị trí cũ
+            return
+        points = self.points[i]
+        points[:] = landmarks
+        points[:, 0] *= width
+        points[:, 1] *= height
+        box = self.boxes[i] = landmark_box(points, self.pad)
+        self.smoothed[i] = self.smoother((box[0] + box[2]) / 2, (box[1] + box[3]) / 2, timestamp)
+        self.smoothed_velocity[i] = self.smoother.velocity
+
+    def slot(self, age=0):
+        if age >= self.count: return None
+        i = (self.index - age) % self.capacity
+        return i if self.valid[i] else None
+
+    def get(self, age=0):
+        i = self.slot(age)
+        return None if i is None else self.points[i]
+
+    def time(self, age=0): return self.times[(self.index - age) % self.capacity] if age < self.count else None
+
+    def box(self, age=0):
+        i = self.slot(age)
+        return None if i is None else tuple(int(v) for v in self.boxes[i])
+
+    def center(self, age=0):
+        box = self.box(age)
+        return None if box is None else ((box[0] + box[2]) // 2, (box[1] + box[3]) // 2)
+
+    def wrist(self, age=0):
+        points = self.get(age)
+        return None if points is None else (int(points[WRIST, 0]), int(points[WRIST, 1]))
+
+    def smooth_center(self, age=0, lead=0.0):
+        # Tâm khung bao đã lọc, dự đoán thêm `lead` giây theo vận tốc đã lọc (lead=0: chỉ làm mượt)
+        i = self.slot(age)
+        return None if i is None else tuple(self.smoothed[i] + self.smoothed_velocity[i] * lead)
+
+    def smooth_velocity(self, age=0):
+        i = self.slot(age)
+        return None if i is None else tuple(self.smoothed_velocity[i])
+
+    def velocity(self, landmark=None, span=3):
+        # Vận tốc (px/s) của một điểm mốc (None = tâm khung bao) giữa khung mới nhất và khung cách `span` khung,
+        # rút ngắn span nếu tay mới xuất hiện; None nếu chưa đủ hai khung liên tiếp có tay.
+        span = min(span, self.count - 1)
+        while span > 0 and any(self.slot(age) is None for age in range(span + 1)): span -= 1
+        if span <= 0: return None
+        i, j = self.slot(0), self.slot(span)
+        dt = self.times[i] - self.times[j]
+        if dt <= 0: return None
+        if landmark is None:
+            now, then = self.boxes[i], self.boxes[j]
+            return ((now[0] + now[2]) - (then[0] + then[2])) / 2 / dt, ((now[1] + now[3]) - (then[1] + then[3])) / 2 / dt
+        return tuple((self.points[i, landmark, :2] - self.points[j, landmark, :2]) / dt)
+
+class FrameSource:
+    # Nguồn khung hình cho HandTracker, cùng giao diện read/isOpened/release với cv2.VideoCapture:
+    # webcam (số), file video, hoặc thư mục ảnh (đọc theo thứ tự tên file). start/stop giới hạn khoảng khung hình
+    # cần đọc (dùng khi chia một đoạn quay thành nhiều phần). Với file và thư mục, thời điểm mỗi khung lấy theo thời gian
+    # trong video (chỉ số khung / fps) thay cho đồng hồ thật, nên các ngưỡng theo giây của bộ phát hiện vẫn đúng
+    # khi xử lý nhanh hoặc chậm hơn thời gian thực. Không mở được nguồn thì raise OSError.
+    IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp')
+
+    def __init__(self, source=0, fps=None, start=0, stop=None):
+        load_cv2()
+        self.source, self.live = source, isinstance(source, int)
+        self.files, self.cap = None, None
+        if not self.live and os.path.isdir(source):
+            self.files = sorted(os.path.join(source, f) for f in os.listdir(source) if f.lower().endswith(self.IMAGE_EXTENSIONS))
+            if not self.files: raise OSError(f"No images found in {source}")
+            self.count, self.fps = len(self.files), fps or 30.0
+        else:
+            self.cap = cv2.VideoCapture(source)
+            if not self.cap.isOpened(): raise OSError(f"Could not open video source {source}")
+            # count None: không biết số khung (webcam, hoặc container không ghi CAP_PROP_FRAME_COUNT -> 0/-1), đọc tới hết nguồn
+            self.count = None if self.live else max(int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT)), 0) or None
+            self.fps = fps or self.cap.get(cv2.CAP_PROP_FPS) or 30.0
+            if start: self.cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+        self.index = start # Chỉ số của khung sẽ đọc tiếp theo
+        self.stop = self.count if stop is None else min(stop, self.count) if self.count is not None else stop
+
+    def isOpened(self): return self.files is not None or self.cap.isOpened()
+
+    def read(self):
+        if self.stop is not None and self.index >= self.stop: return False, None
+        if self.files is not None:
+            frame = cv2.imread(self.files[self.index])
+            ok = frame is not None
+        else: ok, frame = self.cap.read()
+        if ok: self.index += 1
+        return ok, frame
+
+    def time(self): return (self.index - 1) / self.fps # Thời điểm (giây, theo video) của khung vừa đọc
+
+    def release(self):
+        if self.cap is not None: self.cap.release()
+
+class MotionGate:
+    # Lập lịch suy luận theo chuyển động: so ảnh xám thu nhỏ (size px bề ngang, mỗi ô là trung bình một vùng lớn
+    # nên nhiễu camera gần như triệt tiêu) với ảnh của khung được suy luận gần nhất. Ô nào đổi quá `threshold`
+    # mức xám -> có chuyển động, suy luận ngay. Khung gần như không đổi thì bỏ qua hands.process và dùng lại
+    # điểm mốc cũ, nhưng vẫn suy luận định kỳ: sau 1, 2, 4... tối đa max_interval khung bỏ qua liên tiếp.
+    def __init__(self, threshold=8.0, max_interval=8, size=32):
+        self.threshold, self.max_interval, self.size = threshold, max_interval, size
+        self.reference, self.interval, self.skipped = None, 1, 0
+        self.difference = 0.0 # Độ lệch lớn nhất (mức xám) của khung vừa xét, để hiển thị/dò ngưỡng
+
+    def should_infer(self, frame):
+        height, width = frame.shape[:2]
+        step = max(width // (self.size * 4), 1) # Lấy mẫu thưa trước (rẻ) rồi mới lấy trung bình theo vùng
+        small = cv2.resize(frame[::step, ::step], (self.size, max(self.size * height // width, 1)), interpolation=cv2.INTER_AREA)
+        thumbnail = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY).astype(np.int16)
+        if self.reference is not None:
+            self.difference = float(np.abs(thumbnail - self.reference).max())
+            moving = self.difference >= self.threshold
+            if not moving and self.skipped < self.interval:
+                self.skipped += 1
+                return False
+            self.interval = 1 if moving else min(self.interval * 2, self.max_interval)
+        self.reference, self.skipped = thumbnail, 0
+        return True
 
-# Initialize MediaPipe Hands - Khởi tạo một lần và dùng chung
-mp_hands = mp.solutions.hands
-mp_drawing = mp.solutions.drawing_utils
-hands = mp_hands.Hands(
-    max_num_hands=1,
-    min_detection_confidence=0.7,
-    min_tracking_confidence=0.5
-)
+    def reset(self):
+        self.reference, self.interval, self.skipped = None, 1, 0
 
 class HandTracker:
-    def __init__(self):
-        self.cap = cv2.VideoCapture(0)
-        if not self.cap.isOpened():
-            print("Error: Could not open webcam.")
-            exit()
+    # threaded=True: đọc camera và chạy hands.process trên luồng nền, vòng lặp game chỉ lấy kết quả mới nhất.
+    # Hai luồng trao đổi qua một "khe" duy nhất (self._latest): luồng nền gán cả tuple kết quả trong một lệnh
+    # (nguyên tử dưới GIL), nên không cần khóa; khung nào chưa kịp đọc thì bị khung mới ghi đè và bỏ qua.
+    # inference_width: thu nhỏ ảnh đưa vào hands.process về bề rộng này (None = giữ độ phân giải gốc).
+    # roi=True: chỉ suy luận trên vùng quanh bàn tay ở khung trước (nới thêm roi_margin theo kích thước tay),
+    # quay lại cả khung hình khi mất dấu. Điểm mốc luôn được quy đổi về tọa độ của khung hình đầy đủ,
+    # nên các ngưỡng của MoveDetector/DropDetector vẫn giữ nguyên ý nghĩa.
+    # source: chỉ số webcam, file video, thư mục ảnh hoặc một FrameSource (xem ở trên); không mở được thì raise OSError.
+    # smoother: bộ lọc tâm bàn tay cho LandmarkHistory (None = OneEuroFilter mặc định).
+    # motion_gate: MotionGate để bỏ qua suy luận khi khung hình đứng yên (None = suy luận mọi khung);
+    # frames_inferred/frames_skipped đếm số khung đã chạy/bỏ qua hands.process.
+    # debug=False là đường chạy nhanh: không vẽ gì lên khung hình, không imshow, không dựng bảng debug.
+    # Khi bật debug, các lớp phủ được vẽ lên một bản sao của khung hình trong show_frame().
+    def __init__(self, source=0, threaded=True, inference_width=None, roi=False, roi_margin=0.5, roi_min_size=160, debug=False, smoother=None, motion_gate=None):
+        load_hands()
+        self.cap = source if isinstance(source, FrameSource) else FrameSource(source)
         self.frame = None
         self.results = None # Lưu kết quả của mediapipe ở đây
         self.wrist_x, self.wrist_y = None, None
         self.center_x, self.center_y = None, None
         self.frame_width, self.frame_height = None, None
         self.condition_status = "Not Checked"
-
-    def update(self):
+        self.hand_box = None
+        self.timestamp = None # Thời điểm chụp khung hình hiện tại (time.perf_counter; với file/thư mục là thời gian trong video)
+        self.stage_times = {} # Thời gian từng công đoạn của khung hình hiện tại, xem metrics.py
+        self.history = LandmarkHistory(smoother=smoother)
+
+        self.debug = debug
+        self._debug_surface = None
+        self.inference_width = inference_width
+        self.roi, self.roi_margin, self.roi_min_size = roi, roi_margin, roi_min_size
+        self._roi_box = None
+        self.motion_gate = motion_gate
+        self.frames_inferred, self.frames_skipped = 0, 0
+        self._last_output = None # (results, landmarks) của lần suy luận gần nhất, dùng lại cho khung bị bỏ qua
+
+        # FPS của vòng lặp game (tần suất gọi update) và của luồng suy luận
+        self.loop_fps, self.inference_fps = 0.0, 0.0
+        self.frames_dropped = 0
+        self._last_update_time = None
+        self._latest, self._seen_seq = None, 0
+        self.threaded = threaded
+        self._running = threaded
+        if threaded:
+            self._thread = threading.Thread(target=self._worker, name="HandTracker", daemon=True)
+            self._thread.start()
+
+    def _capture_and_process(self):
+        start = time.perf_counter()
         ret, frame = self.cap.read()
-        if not ret:
-            print("Error: Could not read frame.")
-            return False
-        self.frame = cv2.flip(frame, 1)
-        self.frame_height, self.frame_width, _ = self.frame.shape
-        frame_rgb = cv2.cvtColor(self.frame, cv2.COLOR_BGR2RGB)
-        
-        # Xử lý và lưu kết quả vào self.results
-        self.results = hands.process(frame_rgb)
-
-        # Reset trạng thái
-        self.wrist_x, self.wrist_y, self.center_x, self.center_y = None, None, None, None
-        self.condition_status = "Not Checked"
+        if not ret: return None
+        captured = time.perf_counter()
+        timestamp = captured if self.cap.live else self.cap.time()
+        frame = cv2.flip(frame, 1)
+        height, width = frame.shape[:2]
+        if self.motion_gate and self._last_output and not self.motion_gate.should_infer(frame):
+            self.frames_skipped += 1
+            done = time.perf_counter()
+            return frame, *self._last_output, timestamp, (captured - start, done - captured, 0.0, done)
+
+        x0, y0, x1, y1 = self._roi_box if self.roi and self._roi_box else (0, 0, width, height)
+        crop = frame[y0:y1, x0:x1]
+        if self.inference_width and crop.shape[1] > self.inference_width:
+            scale = self.inference_width / crop.shape[1]
+            crop = cv2.resize(crop, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        rgb = cv2.cvtColor(crop, cv2.COLOR_BGR2RGB)
+        converted = time.perf_counter()
+        results = hands.process(rgb)
+
+        landmarks = None
+        if results.multi_hand_landmarks:
+            landmarks = landmarks_to_array(results.multi_hand_landmarks[0])
+            # Tọa độ chuẩn hóa theo vùng cắt -> chuẩn hóa theo khung hình đầy đủ (thu nhỏ đều không làm đổi tọa độ chuẩn hóa)
+            if (x0, y0, x1, y1) != (0, 0, width, height):
+                landmarks[:, 0] = (x0 + landmarks[:, 0] * (x1 - x0)) / width
+                landmarks[:, 1] = (y0 + landmarks[:, 1] * (y1 - y0)) / height
+            if self.roi: self._roi_box = self._next_roi(landmarks, width, height)
+        else:
+            self._roi_box = None
+        self.frames_inferred += 1
+        self._last_output = results, landmarks
+        done = time.perf_counter()
+        # Thời gian (giây) các công đoạn: đọc camera, lật/cắt/đổi màu, hands.process; done dùng để tính thời gian chờ
+        timings = (captured - start, converted - captured, done - converted, done)
+        return frame, results, landmarks, timestamp, timings
+
+    def _next_roi(self, landmarks, width, height):
+        min_x, min_y, max_x, max_y = landmark_box(landmarks * (width, height, 1), pad=0)
+        size = max(max_x - min_x, max_y - min_y, self.roi_min_size)
+        half = int(size * (0.5 + self.roi_margin))
+        cx, cy = (min_x + max_x) // 2, (min_y + max_y) // 2
+        return max(cx - half, 0), max(cy - half, 0), min(cx + half, width), min(cy + half, height)
+
+    def _worker(self):
+        seq, last_time = 0, time.perf_counter()
+        while self._running:
+            output = self._capture_and_process()
+            if output is None:
+                time.sleep(0.01)
+                continue
+            now = time.perf_counter()
+            self.inference_fps = update_fps(self.inference_fps, now - last_time)
+            seq, last_time = seq + 1, now
+            self._latest = (seq, *output)
 
-        if self.results.multi_hand_landmarks:
-            for hand_landmarks in self.results.multi_hand_landmarks:
-                mp_drawing.draw_landmarks(
-                    self.frame, hand_landmarks, mp_hands.HAND_CONNECTIONS,
-                    mp_drawing.DrawingSpec(color=(0, 255, 0), thickness=2, circle_radius=4),
-                    mp_drawing.DrawingSpec(color=(0, 0, 255), thickness=2)
-                )
-
-                wrist = hand_landmarks.landmark[0]
-                self.wrist_x = int(wrist.x * self.frame_width)
-                self.wrist_y = int(wrist.y * self.frame_height)
-
-                x_coords = [lm.x * self.frame_width for lm in hand_landmarks.landmark]
-                y_coords = [lm.y * self.frame_height for lm in hand_landmarks.landmark]
-                min_x, max_x = int(min(x_coords)) - 20, int(max(x_coords)) + 20
-                min_y, max_y = int(min(y_coords)) - 20, int(max(y_coords)) + 20
-
-                cv2.rectangle(self.frame, (min_x, min_y), (max_x, max_y), (255, 255, 0), 2)
-                self.center_x = (min_x + max_x) // 2
-                self.center_y = (min_y + max_y) // 2
-                cv2.circle(self.frame, (self.center_x, self.center_y), 5, (0, 255, 255), -1)
-
-                self.condition_status = "Checked"
+    def update(self):
+        now = time.perf_counter()
+        if self._last_update_time is not None: self.loop_fps = update_fps(self.loop_fps, now - self._last_update_time)
+        self._last_update_time = now
+
+        if self.threaded:
+            latest = self._latest
+            if latest is None or latest[0] == self._seen_seq: return False # Chưa có kết quả mới
+            if self._seen_seq: self.frames_dropped += latest[0] - self._seen_seq - 1
+            self._seen_seq, frame, results, landmarks, timestamp, timings = latest
+        else:
+            output = self._capture_and_process()
+            if output is None:
+                if self.cap.live: print("Error: Could not read frame.") # Với file/thư mục: đã hết khung hình
+                return False
+            frame, results, landmarks, timestamp, timings = output
+            self.inference_fps = self.loop_fps
+        self._apply(frame, results, landmarks, timestamp, timings)
         return True
 
+    def _apply(self, frame, results, landmarks, timestamp, timings):
+        # results là đầu ra thô của MediaPipe (tọa độ có thể theo vùng cắt ROI);
+        # tọa độ đã quy đổi về khung hình đầy đủ nằm trong self.history
+        self.frame = frame
+        self.frame_height, self.frame_width, _ = self.frame.shape
+        self.results, self.timestamp = results, timestamp
+        read, convert, process, done = timings
+        # wait: từ lúc suy luận xong đến lúc vòng lặp game nhận kết quả (gần 0 khi chạy không luồng)
+        self.stage_times = {'read': read, 'convert': convert, 'process': process, 'wait': time.perf_counter() - done}
+        self.history.push(landmarks, self.frame_width, self.frame_height, timestamp)
+
+        # Các thuộc tính cũ được suy ra từ bộ đệm chung
+        self.hand_box = self.history.box()
+        if self.hand_box:
+            self.wrist_x, self.wrist_y = self.history.wrist()
+            self.center_x, self.center_y = self.history.center()
+            self.condition_status = "Checked"
+        else:
+            self.wrist_x, self.wrist_y, self.center_x, self.center_y = None, None, None, None
+            self.condition_status = "Not Checked"
+
+    def set_debug(self, enabled):
+        if self.debug and not enabled: cv2.destroyAllWindows()
+        self.debug = enabled
+
+    def draw_overlay(self, image):
+        points = self.history.get()
+        if points is None: return
+        pixels = points[:, :2].astype(int)
+        for a, b in mp_hands.HAND_CONNECTIONS: cv2.line(image, tuple(pixels[a]), tuple(pixels[b]), (0, 0, 255), 2)
+        for point in pixels: cv2.circle(image, tuple(point), 4, (0, 255, 0), -1)
+        if self.hand_box:
+            min_x, min_y, max_x, max_y = self.hand_box
+            cv2.rectangle(image, (min_x, min_y), (max_x, max_y), (255, 255, 0), 2)
+            cv2.circle(image, (self.center_x, self.center_y), 5, (0, 255, 255), -1)
+
     def draw_debug_info(self, gesture, movement):
-        debug_surface = pygame.Surface((280, 150), pygame.SRCALPHA)
-        font = pygame.font.Font("Roboto-Regular.ttf", 18)
+        # Surface được tạo một lần rồi dùng lại ở các khung hình sau; chữ lấy từ bộ đệm chung của render.py
+        if self._debug_surface is None: self._debug_surface = pygame.Surface((280, 210), pygame.SRCALPHA)
+        debug_surface = self._debug_surface
+        debug_surface.fill((0, 0, 0, 0))
         
-        pygame.draw.rect(debug_surface, (15, 15, 35, 200), (0, 0, 280, 150), border_radius=8)
-        pygame.draw.rect(debug_surface, (50, 200, 255), (0, 0, 280, 150), 2, border_radius=8)
+        pygame.draw.rect(debug_surface, (15, 15, 35, 200), (0, 0, 280, 210), border_radius=8)
+        pygame.draw.rect(debug_surface, (50, 200, 255), (0, 0, 280, 210), 2, border_radius=8)
 
         info = [
             f"Gesture: {gesture}",
             f"Movement: {movement}",
             f"Center: ({self.center_x}, {self.center_y})" if self.center_x else "Center: N/A",
-            f"Status: {self.condition_status}"
+            f"Status: {self.condition_status}",
+            f"FPS: game {self.loop_fps:.0f} / infer {self.inference_fps:.0f}",
+            f"Inferred: {self.frames_inferred} / skipped {self.frames_skipped}",
+            f"Text cache: {text_cache.hit_rate:.0%} hit ({len(text_cache.surfaces)})"
         ]
 
         for i, text in enumerate(info):
-            text_surf = font.render(text, True, (220, 220, 255))
-            debug_surface.blit(text_surf, (15, 15 + i * 30))
+            text_surf = render_text(text, 18, (220, 220, 255))
+            debug_surface.blit(text_surf, (15, 12 + i * 27))
         return debug_surface
 
-    def show_frame(self):
-        cv2.imshow("Hand Tracking", self.frame)
+    def show_frame(self, *detectors):
+        # Chỉ chạy khi bật debug; vẽ lên bản sao để khung hình gốc dùng cho nhận diện không bị sửa
+        if not self.debug or self.frame is None: return
+        image = self.frame.copy()
+        self.draw_overlay(image)
+        for detector in detectors: detector.draw_overlay(image)
+        cv2.imshow("Hand Tracking", image)
 
     def release(self):
+        if self._running:
+            self._running = False
+            self._thread.join(timeout=1.0)
         if self.cap.isOpened():
             self.cap.release()
         cv2.destroyAllWindows()
 
+def hand_centers(history, smoothed=False):
+    # (tâm khung hiện tại, tâm khung trước) cho MoveDetector/DropDetector: thô hoặc đã lọc
+    if smoothed: return history.smooth_center(), history.smooth_center(1)
+    return history.center(), history.center(1)
+
+def hand_lead(history, smoothed=False, lead=0.0):
+    # Quãng đường (px) tay sẽ đi thêm trong `lead` giây theo vận tốc đã lọc, cộng vào độ dời tích lũy khi so ngưỡng.
+    # Chỉ cộng lúc so chứ không tích lũy, nên khi tay giảm tốc ở cuối cú gạt không sinh ra cử chỉ ngược chiều.
+    if not smoothed or not lead: return 0.0, 0.0
+    vx, vy = history.smooth_velocity()
+    return vx * lead, vy * lead
+
 class MoveDetector:
-    def __init__(self):
+    # smoothed=True: dùng tâm bàn tay đã lọc (LandmarkHistory.smooth_center) thay cho tâm khung bao thô và kích hoạt
+    # sớm hơn `lead` giây theo vận tốc đã lọc (hand_lead); ít rung hơn nên có thể hạ MOVE_THRESHOLD để phản hồi sớm hơn.
+    # Khi đó mỗi cú gạt chỉ kích hoạt một lần: sau khi kích hoạt, độ dời bị bỏ qua tới khi vận tốc ngang đã lọc tụt dưới
+    # rearm_speed (px/s), nếu không phần dự đoán đã vượt ngưỡng sẽ kích hoạt lại ở gần như mọi khung khi tay còn di chuyển.
+    def __init__(self, move_threshold=15, smoothed=False, lead=0.0, rearm_speed=100):
         self.BOX_SIZE = 200
-        self.MOVE_THRESHOLD = 15
-        self.last_center_x = None
+        self.MOVE_THRESHOLD = move_threshold # Độ dời ngang tích lũy (px) để tính là một lần di chuyển
+        self.smoothed, self.lead, self.rearm_speed, self.armed = smoothed, lead, rearm_speed, True
         self.cumulative_delta_x = 0
         self.movement = ""
         self.box_left, self.box_right, self.box_top, self.box_bottom = None, None, None, None
@@ -113,34 +472,40 @@ class MoveDetector:
             self.box_bottom = (tracker.frame_height // 2) + (self.BOX_SIZE // 2)
         
         if self.box_left is None: return ""
-
-        cv2.rectangle(tracker.frame, (self.box_left, self.box_top), (self.box_right, self.box_bottom), (0, 255, 255), 2)
         
         self.movement = ""
-        if tracker.center_x is None or tracker.center_y is None:
-            self.last_center_x, self.cumulative_delta_x = None, 0
+        center, last_center = hand_centers(tracker.history, self.smoothed)
+        if center is None:
+            self.cumulative_delta_x, self.armed = 0, True
             return self.movement
 
-        hand_in_box = self.box_left <= tracker.center_x <= self.box_right and self.box_top <= tracker.center_y <= self.box_bottom
+        hand_in_box = self.box_left <= center[0] <= self.box_right and self.box_top <= center[1] <= self.box_bottom
 
         if hand_in_box:
-            if self.last_center_x is not None:
-                delta_x = tracker.center_x - self.last_center_x
+            if not self.armed:
+                self.movement, self.cumulative_delta_x = "In Box", 0
+                self.armed = abs(tracker.history.smooth_velocity()[0]) < self.rearm_speed
+            elif last_center is not None:
+                delta_x = center[0] - last_center[0]
                 self.cumulative_delta_x += delta_x
-                if self.cumulative_delta_x > self.MOVE_THRESHOLD:
-                    self.movement, self.cumulative_delta_x = "Move Right", 0
-                elif self.cumulative_delta_x < -self.MOVE_THRESHOLD:
-                    self.movement, self.cumulative_delta_x = "Move Left", 0
+                projected = self.cumulative_delta_x + hand_lead(tracker.history, self.smoothed, self.lead)[0]
+                if projected > self.MOVE_THRESHOLD:
+                    self.movement, self.cumulative_delta_x, self.armed = "Move Right", 0, not self.smoothed
+                elif projected < -self.MOVE_THRESHOLD:
+                    self.movement, self.cumulative_delta_x, self.armed = "Move Left", 0, not self.smoothed
                 else:
                     self.movement = "In Box"
             else:
                 self.movement = "In Box"
         else:
-            self.movement, self.cumulative_delta_x = "Outside Box", 0
+            self.movement, self.cumulative_delta_x, self.armed = "Outside Box", 0, True
 
-        self.last_center_x = tracker.center_x
         return self.movement
 
+    def draw_overlay(self, image):
+        if self.box_left is None: return
+        cv2.rectangle(image, (self.box_left, self.box_top), (self.box_right, self.box_bottom), (0, 255, 255), 2)
+
 # =================================================================================
 # LỚP PHÁT HIỆN "BÚNG TAY" MỚI - ĐỂ XOAY KHỐI
 # =================================================================================
@@ -151,29 +516,26 @@ class FingerTapDetector:
         self.cooldown = cooldown  # Nghỉ 0.5s sau mỗi lần xoay
         
         self.is_ready = False
-        self.time_finger_up = 0
-        self.last_tap_time = 0
+        self.time_finger_up = None # None: chưa đặt (thời gian video offline bắt đầu từ 0.0)
+        self.last_tap_time = None
 
     def detect(self, tracker):
-        current_time = pygame.time.get_ticks() / 1000.0
+        current_time = tracker.history.time() # Thời điểm chụp khung hình, không phụ thuộc đồng hồ của pygame
         self.gesture = "None"
 
-        if current_time - self.last_tap_time < self.cooldown:
+        if current_time is None or (self.last_tap_time is not None and current_time - self.last_tap_time < self.cooldown):
             return self.gesture
 
-        if not tracker.results or not tracker.results.multi_hand_landmarks:
+        points = tracker.history.get()
+        if points is None:
             self.is_ready = False
-            self.time_finger_up = 0
+            self.time_finger_up = None
             return self.gesture
 
-        hand_landmarks = tracker.results.multi_hand_landmarks[0]
-        index_tip = hand_landmarks.landmark[8]
-        index_pip = hand_landmarks.landmark[6]
-        
-        is_finger_up = index_tip.y < index_pip.y
+        is_finger_up = points[INDEX_TIP, 1] < points[INDEX_PIP, 1]
 
         if is_finger_up:
-            if self.time_finger_up == 0:
+            if self.time_finger_up is None:
                 self.time_finger_up = current_time
             
             if not self.is_ready and (current_time - self.time_finger_up > self.ready_threshold):
@@ -184,29 +546,45 @@ class FingerTapDetector:
                 self.last_tap_time = current_time
             
             self.is_ready = False
-            self.time_finger_up = 0
+            self.time_finger_up = None
             
         return self.gesture
 
 class DropDetector:
-    def __init__(self, move_threshold=20):
+    # min_velocity (px/s): nếu đặt, kích hoạt theo vận tốc đi xuống của tâm bàn tay (đọc từ LandmarkHistory)
+    # thay vì độ dời tích lũy từng khung; phải chậm lại dưới một nửa ngưỡng mới kích hoạt lại được.
+    # smoothed/lead/rearm_speed: như MoveDetector (kích hoạt lại khi vận tốc đi xuống đã lọc tụt dưới rearm_speed);
+    # với min_velocity, vận tốc lấy từ bộ lọc thay vì sai phân khung bao thô.
+    def __init__(self, move_threshold=20, min_velocity=None, smoothed=False, lead=0.0, rearm_speed=100):
         self.gesture = "None"
-        self.last_center_y = None
         self.cumulative_delta_y = 0
         self.MOVE_THRESHOLD = move_threshold # Độ nhạy của chuyển động
+        self.min_velocity, self.armed = min_velocity, True
+        self.smoothed, self.lead, self.rearm_speed = smoothed, lead, rearm_speed
 
     def detect(self, tracker):
         self.gesture = "None"
+        center, last_center = hand_centers(tracker.history, self.smoothed)
 
         # Nếu không có tay, reset và thoát
-        if tracker.center_y is None:
-            self.last_center_y = None
-            self.cumulative_delta_y = 0
+        if center is None:
+            self.cumulative_delta_y, self.armed = 0, True
             return self.gesture
 
-        if self.last_center_y is not None:
+        if self.min_velocity is not None:
+            velocity = tracker.history.smooth_velocity() if self.smoothed else tracker.history.velocity()
+            if velocity is None: return self.gesture
+            if self.armed and velocity[1] > self.min_velocity:
+                self.gesture, self.armed = "Drop Down", False
+            elif velocity[1] < self.min_velocity / 2:
+                self.armed = True
+            return self.gesture
+
+        if not self.armed:
+            self.cumulative_delta_y, self.armed = 0, tracker.history.smooth_velocity()[1] < self.rearm_speed
+        elif last_center is not None:
             # Tính toán sự thay đổi vị trí theo chiều dọc
-            delta_y = tracker.center_y - self.last_center_y
+            delta_y = center[1] - last_center[1]
 
             # Chỉ tích lũy khi tay đi xuống (delta_y > 0)
             if delta_y > 0:
@@ -216,29 +594,28 @@ class DropDetector:
                 self.cumulative_delta_y = 0
             
             # Nếu di chuyển xuống đủ nhiều, kích hoạt cử chỉ
-            if self.cumulative_delta_y > self.MOVE_THRESHOLD:
+            if self.cumulative_delta_y + hand_lead(tracker.history, self.smoothed, self.lead)[1] > self.MOVE_THRESHOLD:
                 self.gesture = "Drop Down"
                 # Reset ngay lập tức để cử chỉ chỉ kích hoạt 1 lần cho mỗi cú trượt tay
-                self.cumulative_delta_y = 0
+                self.cumulative_delta_y, self.armed = 0, not self.smoothed
 
-        # Cập nhật vị trí cuối cùng của tay
-        self.last_center_y = tracker.center_y
         return self.gesture
 
 class WaveDetector:
-    def __init__(self):
-        self.WAVE_THRESHOLD, self.WAVE_COUNT_needed = 80, 3
-        self.wave_directions, self.last_wrist_x = [], None
+    def __init__(self, wave_threshold=80):
+        self.WAVE_THRESHOLD, self.WAVE_COUNT_needed = wave_threshold, 3
+        self.wave_directions = []
         self.gesture = "None"
 
     def detect(self, tracker):
         self.gesture = "None"
-        if tracker.wrist_x is None:
-            self.last_wrist_x, self.wave_directions = None, []
+        wrist, last_wrist = tracker.history.wrist(), tracker.history.wrist(1)
+        if wrist is None:
+            self.wave_directions = []
             return self.gesture
 
-        if self.last_wrist_x is not None:
-            delta_x = tracker.wrist_x - self.last_wrist_x
+        if last_wrist is not None:
+            delta_x = wrist[0] - last_wrist[0]
             
             if delta_x > self.WAVE_THRESHOLD:
                 if not self.wave_directions or self.wave_directions[-1] != 'R': self.wave_directions.append('R')
@@ -249,7 +626,6 @@ class WaveDetector:
             if len(self.wave_directions) >= self.WAVE_COUNT_needed:
                 self.gesture, self.wave_directions = "Wave (Play Again)", []
 
-        self.last_wrist_x = tracker.wrist_x
         return self.gesture
 
 # Bỏ đi lớp PointUpDetector vì ta không dùng nữa
\ No newline at end of file
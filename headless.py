@@ -0,0 +1,86 @@
+# headless.py
+# Chạy hàng loạt ván AI không cần màn hình và báo tốc độ mô phỏng.
+# Ví dụ: python headless.py --games 1000 --max-pieces 100
+#        python headless.py --check 300   # đối chiếu các bộ đánh giá nhanh với bản vô hướng
+import argparse
+import random
+import sys
+import time
+from engine import ROWS, COLS, FULL_ROW, SHAPES, ROTATIONS, TetrisEngine, PieceGenerator
+from ai import find_best_move, find_best_move_batch, find_best_move_incremental, play_move, play_plan, LookaheadAI, load_weights, WEIGHTS_FILE
+from replay import Recorder, save_game
+
+SEARCHES = {'scalar': find_best_move, 'batch': find_best_move_batch, 'incremental': find_best_move_incremental, 'lookahead': None, 'reachable': None}
+
+def play_game(max_pieces=None, search=find_best_move, generator=None, recorder=None, plan=False):
+    # plan=True: search trả về chuỗi thao tác (LookaheadAI.find_best_plan) thay vì (số lần xoay, x)
+    game = TetrisEngine(generator, recorder)
+    while not game.game_over and (max_pieces is None or game.pieces < max_pieces):
+        if plan: play_plan(game, search(game))
+        else: play_move(game, *search(game))
+    return game
+
+def check_evaluators(count=300, seed=0):
+    # Đối chiếu find_best_move_batch và find_best_move_incremental với bản vô hướng find_best_move (chuẩn tham chiếu)
+    # trên các thế cờ sinh cố định: AI tham lam chơi vài chục khối rồi bảng bị lật ngẫu nhiên một số ô (tạo lỗ, cột lởm chởm),
+    # không bao giờ tạo hàng đầy (engine không để lại hàng đầy). Trả về danh sách (chỉ số bảng, khối, tên, nước đi, nước chuẩn).
+    rng, mismatches = random.Random(seed), []
+    for i in range(count):
+        game = TetrisEngine(PieceGenerator(seed + i))
+        for _ in range(rng.randrange(60)):
+            if game.game_over: break
+            play_move(game, *find_best_move_incremental(game))
+        board = game.board
+        for _ in range(rng.randrange(12)):
+            y, x = rng.randrange(6, ROWS), rng.randrange(COLS)
+            mask = board.rows[y] ^ (1 << x)
+            if mask == FULL_ROW: continue
+            board.rows[y] = mask
+            board.cells[y][x] = 'X' if mask >> x & 1 else 0
+        board.rebuild_features()
+        for key in SHAPES:
+            game.piece_key, game.rotation = key, rng.randrange(4) % len(ROTATIONS[key])
+            expected = find_best_move(game)
+            for name, search in (('batch', find_best_move_batch), ('incremental', find_best_move_incremental)):
+                move = search(game)
+                if move != expected: mismatches.append((i, key, name, move, expected))
+    return mismatches
+
+def main():
+    parser = argparse.ArgumentParser(description="Mô phỏng AI Tetris không cần pygame")
+    parser.add_argument("--games", type=int, default=100, help="số ván cần chạy")
+    parser.add_argument("--max-pieces", type=int, default=100, help="giới hạn số khối mỗi ván (0 = chơi đến khi thua)")
+    parser.add_argument("--seed", type=int, default=None, help="seed của ván đầu tiên, các ván sau dùng seed + i")
+    parser.add_argument("--bag", action="store_true", help="dùng bộ sinh khối 7-bag")
+    parser.add_argument("--record", metavar="DIR", help="lưu bản ghi từng ván vào thư mục DIR")
+    parser.add_argument("--search", choices=SEARCHES, default="incremental", help="bộ đánh giá: vô hướng, numpy hàng loạt, tăng dần, nhìn trước nhiều khối, hoặc nhìn trước trên mọi vị trí tới được (luồn/xoay kẹt)")
+    parser.add_argument("--depth", type=int, default=2, help="số khối nhìn trước (chỉ dùng với --search lookahead/reachable)")
+    parser.add_argument("--beam-width", type=int, default=4)
+    parser.add_argument("--budget", type=float, default=0.004, help="thời gian tối đa cho mỗi quyết định (giây)")
+    parser.add_argument("--weights", default=WEIGHTS_FILE, help="file trọng số do tune.py tạo ra")
+    parser.add_argument("--check", type=int, metavar="N", help="chỉ đối chiếu các bộ đánh giá batch/incremental với bản vô hướng trên N bảng sinh từ --seed (mã thoát 1 nếu lệch)")
+    args = parser.parse_args()
+
+    load_weights(args.weights)
+    if args.check:
+        mismatches = check_evaluators(args.check, args.seed or 0)
+        for i, key, name, move, expected in mismatches[:20]: print(f"board {i} piece {key}: {name} {move} != find_best_move {expected}")
+        print(f"{args.check} boards x {len(SHAPES)} pieces: {len(mismatches)} mismatches")
+        sys.exit(1 if mismatches else 0)
+    search = SEARCHES[args.search]
+    if args.search == 'lookahead': search = LookaheadAI(args.depth, args.beam_width, args.budget).find_best_move
+    elif args.search == 'reachable': search = LookaheadAI(args.depth, args.beam_width, args.budget).find_best_plan
+    total_pieces, total_lines = 0, 0
+    start = time.perf_counter()
+    for i in range(args.games):
+        generator = PieceGenerator(None if args.seed is None else args.seed + i, 'bag' if args.bag else 'uniform')
+        game = play_game(args.max_pieces or None, search, generator, Recorder(generator) if args.record else None, args.search == 'reachable')
+        if args.record: save_game(game, args.record, f"ai-{i}")
+        total_pieces, total_lines = total_pieces + game.pieces, total_lines + game.lines
+    elapsed = time.perf_counter() - start
+
+    print(f"{args.games} games, {total_pieces} pieces, {total_lines} lines in {elapsed:.2f}s")
+    print(f"{args.games / elapsed:.1f} games/sec, {total_pieces / elapsed:.0f} pieces/sec")
+
+if __name__ == "__main__":
+    main()
@@ -1,50 +1,60 @@
 # main_game.py
+import time
+STARTUP_START = time.perf_counter() # Mốc đo thời gian khởi động (báo ở __main__)
 import os, sys
+import argparse
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 import pygame
 import random
+from collections import deque
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
 import math
-from hand_control import * # Import tất cả các lớp từ file hand_control
-
-pygame.init()
+from fractions import Fraction
+from engine import * # Lõi luật chơi (bitboard, bảng xoay, TetrisEngine)
+# hand_control chỉ nạp cv2/MediaPipe khi chế độ solo tạo HandTracker (hoặc khi warm_up() chạy nền ở menu)
+import hand_control
+from hand_control import HandTracker, MotionGate, MoveDetector, DropDetector, WaveDetector, FingerTapDetector
+import ai
+import replay
+import metrics
+from particles import ParticlePool
+from render import get_font, render_text, text_cache, ScrollingGrid, StaticBackground, Layer, LayeredRenderer, scale_region
 
 # --- CẤU HÌNH VÀ HẰNG SỐ ---
 WIDTH, HEIGHT = 1280, 720
-ROWS, COLS = 20, 10
 BLOCK = 30
 BOARD_WIDTH = COLS * BLOCK
 BOARD_HEIGHT = ROWS * BLOCK
 FONT_SIZE = 24
 
-win = pygame.display.set_mode((WIDTH, HEIGHT))
-pygame.display.set_caption("Neon Tetris")
-clock = pygame.time.Clock()
-
-try:
-    font = pygame.font.Font("Roboto-Regular.ttf", FONT_SIZE)
-    logo_img = pygame.image.load("logo.png").convert_alpha()
-    logo_img = pygame.transform.scale(logo_img, (180, 180))
-except pygame.error as e:
-    print(f"Lỗi tải file: {e}. Hãy chắc chắn file 'Roboto-Regular.ttf' và 'logo.png' có trong thư mục.")
-    exit()
+# Cửa sổ, font, logo, atlas khối và nền lưới được tạo trong init_display(), không phải lúc import,
+# nên headless.py/bench.py/các công cụ khác import được logic của main.py mà không mở cửa sổ
+win, clock, logo_img = None, None, None
+
+# Bộ sinh khối ('uniform' hoặc 'bag') và thư mục lưu bản ghi ván chơi (None = không ghi), đặt qua dòng lệnh
+PIECE_MODE, RECORD_DIR = 'uniform', None
+# Lớp phủ debug của nhận diện tay (cửa sổ camera + bảng thông tin); bật bằng --debug hoặc phím F3 trong game
+HAND_DEBUG = False
+# MoveDetector/DropDetector dùng tâm tay đã lọc One-Euro và kích hoạt sớm HAND_LEAD giây theo vận tốc, với ngưỡng thấp hơn
+# (10/12 px thay vì 15/20) và chỉ kích hoạt một lần mỗi cú gạt — xem bảng so sánh của bench.py --only filter; tắt bằng --raw-hand
+HAND_SMOOTHING, HAND_LEAD = True, 0.08
+# Bỏ qua hands.process khi khung hình camera gần như đứng yên (MotionGate), dùng lại điểm mốc cũ; tắt bằng --no-skip
+HAND_SKIP = True
+# Thu nhỏ ảnh đưa vào hands.process về bề rộng này (None = độ phân giải gốc) và chỉ suy luận quanh bàn tay ở khung trước;
+# đặt bằng --inference-width / --roi
+HAND_INFERENCE_WIDTH, HAND_ROI = None, False
+# File xuất số đo độ trễ camera -> hành động của chế độ solo (.csv hoặc .json), đặt bằng --latency
+LATENCY_FILE = None
+
+# Trọng số AI đã dò bằng tune.py (nếu có file weights.json)
+ai.load_weights()
 
 # --- BẢNG MÀU NEON ---
 COLORS = { 'background': (10, 10, 25), 'grid': (20, 30, 70), 'panel_bg': (15, 15, 35, 200), 'panel_border': (50, 200, 255), 'text': (220, 220, 255), 'glow_text': (100, 255, 255), 'game_over': (255, 50, 50), 'ghost': (255, 255, 255, 50) }
-SHAPES = { 'I': [[1, 1, 1, 1]], 'O': [[1, 1], [1, 1]], 'T': [[0, 1, 0], [1, 1, 1]], 'S': [[0, 1, 1], [1, 1, 0]], 'Z': [[1, 1, 0], [0, 1, 1]], 'J': [[1, 0, 0], [1, 1, 1]], 'L': [[0, 0, 1], [1, 1, 1]] }
 SHAPE_COLORS = { 'I': (0, 220, 255), 'O': (255, 220, 0), 'T': (200, 50, 255), 'S': (50, 255, 100), 'Z': (255, 50, 50), 'J': (50, 100, 255), 'L': (255, 150, 0) }
 TRASH_TALK_LINES = ["Gà quá vậy bạn ơi", "Đặt khối vậy là thua chắc rồi", "Chơi riết mà vẫn vậy hả?", "Tui không cố đâu, tại bạn yếu", "Sắp x2 điểm rồi đó, chịu không?", "Có cần tui nhường không bạn?"]
 
-# --- CÁC HÀM TIỆN ÍCH VÀ VẼ ---
-def rotate(shape): return [list(row)[::-1] for row in zip(*shape)]
-def check_collision(board, shape, offset):
-    ox, oy = offset
-    for y, row in enumerate(shape):
-        for x, val in enumerate(row):
-            if val and (x + ox < 0 or x + ox >= COLS or y + oy >= ROWS or (y + oy >= 0 and board[y + oy][x + ox])): return True
-    return False
-def clear_rows(board):
-    new_board = [row for row in board if not all(row)]
-    return [[0]*COLS for _ in range(ROWS - len(new_board))] + new_board, ROWS - len(new_board)
 def draw_detailed_block(surface, color, rect, is_ghost=False):
     if is_ghost:
         pygame.draw.rect(surface, COLORS['ghost'], rect, 2, border_radius=3)
@@ -52,218 +62,339 @@ def draw_detailed_block(surface, color, rect, is_ghost=False):
     highlight = tuple(min(c + 80, 255) for c in color)
     pygame.draw.rect(surface, color, rect.inflate(-6, -6), border_radius=4)
     pygame.draw.rect(surface, highlight, rect, 1, border_radius=5)
-def draw_panel(surface, rect, title, title_font):
+
+# --- ATLAS KHỐI VẼ SẴN ---
+# Mỗi màu khối (cùng màu xám khi thua và viền bóng) được vẽ một lần cho cỡ ô bảng và cỡ xem trước (0.7),
+# khi vẽ bảng chỉ còn blit. Viền bóng dùng màu RGB của COLORS['ghost'] không kèm alpha, giống hệt khi vẽ
+# thẳng lên cửa sổ (màn hình không có kênh alpha nên pygame.draw bỏ qua alpha). Mọi điểm vẽ đều đục nên
+# sprite dùng colorkey (blit RLE nhanh hơn per-pixel alpha) thay vì SRCALPHA.
+PREVIEW_BLOCK = int(BLOCK * 0.7)
+GAME_OVER_COLOR = (80, 80, 80)
+SPRITE_COLORKEY = (255, 0, 255)
+BLOCK_SPRITES = {}
+
+def build_block_atlas():
+    for size in (BLOCK, PREVIEW_BLOCK):
+        for key, color in (*SHAPE_COLORS.items(), ('game_over', GAME_OVER_COLOR), ('ghost', None)):
+            sprite = pygame.Surface((size, size)).convert()
+            sprite.fill(SPRITE_COLORKEY)
+            if key == 'ghost': pygame.draw.rect(sprite, COLORS['ghost'][:3], (0, 0, size, size), 2, border_radius=3)
+            else: draw_detailed_block(sprite, color, pygame.Rect(0, 0, size, size))
+            sprite.set_colorkey(SPRITE_COLORKEY, pygame.RLEACCEL)
+            BLOCK_SPRITES[key, size] = sprite
+
+def draw_panel(surface, rect, title):
     panel_surface = pygame.Surface(rect.size, pygame.SRCALPHA)
     pygame.draw.rect(panel_surface, COLORS['panel_bg'], (0, 0, *rect.size), border_radius=8)
     pygame.draw.rect(panel_surface, COLORS['panel_border'], (0, 0, *rect.size), 2, border_radius=8)
     if title:
-        title_surf = title_font.render(title, True, COLORS['text'])
+        title_surf = render_text(title, FONT_SIZE, COLORS['text'])
         panel_surface.blit(title_surf, (rect.width / 2 - title_surf.get_width() / 2, 15))
     surface.blit(panel_surface, rect.topleft)
-def draw_animated_grid_bg(surface, offset):
-    for i in range(0, HEIGHT, 40): pygame.draw.line(surface, COLORS['grid'], (0, (i + offset) % HEIGHT), (WIDTH, (i + offset) % HEIGHT))
-    for i in range(0, WIDTH, 40): pygame.draw.line(surface, COLORS['grid'], ((i + offset) % WIDTH, 0), ((i + offset) % WIDTH, HEIGHT))
-
-class Particle:
-    def __init__(self, x, y, color):
-        self.x, self.y, self.color = x, y, color
-        self.vx, self.vy = random.uniform(-4, 4), random.uniform(-6, 2)
-        self.alpha, self.size = 255, random.randint(3, 7)
-        self.lifetime = random.uniform(0.4, 0.8)
-    def update(self, dt):
-        self.x, self.y, self.vy, self.alpha, self.lifetime = self.x + self.vx, self.y + self.vy, self.vy + 0.2, self.alpha - (255 / self.lifetime) * dt, self.lifetime - dt
-        return self.lifetime > 0
-    def draw(self, surface):
-        if self.alpha > 0:
-            temp_surface = pygame.Surface((self.size, self.size), pygame.SRCALPHA)
-            pygame.draw.rect(temp_surface, (*self.color, int(self.alpha)), (0, 0, self.size, self.size))
-            surface.blit(temp_surface, (int(self.x), int(self.y)))
-
-class Tetris:
-    # (Same as the previous complete version)
-    # ... [Implementation of Tetris class including spawn_piece, move, rotate_piece, lock_piece, update, and draw]
-    def __init__(self, offset_x=0):
+# Nền lưới cuộn vẽ sẵn một lần (đã gồm màu nền), mỗi khung chỉ blit lệch theo offset
+BACKGROUND = None
+def draw_animated_grid_bg(surface, offset): BACKGROUND.draw(surface, offset)
+
+def init_display():
+    # Mở cửa sổ và nạp tài nguyên vẽ; gọi lại lần nữa không làm gì
+    global win, clock, logo_img, BACKGROUND
+    if win is not None: return win
+    pygame.init()
+    win = pygame.display.set_mode((WIDTH, HEIGHT))
+    pygame.display.set_caption("Neon Tetris")
+    clock = pygame.time.Clock()
+    try:
+        get_font(FONT_SIZE) # Nạp sẵn font mặc định để báo lỗi sớm nếu thiếu file
+        logo_img = pygame.image.load("logo.png").convert_alpha()
+        logo_img = pygame.transform.scale(logo_img, (180, 180))
+    except pygame.error as e:
+        print(f"Lỗi tải file: {e}. Hãy chắc chắn file 'Roboto-Regular.ttf' và 'logo.png' có trong thư mục.")
+        exit()
+    build_block_atlas()
+    BACKGROUND = ScrollingGrid((WIDTH, HEIGHT), 40, COLORS['grid'], COLORS['background'])
+    return win
+
+def board_panel():
+    # Khung bảng, lưới và hai panel NEXT/SCORE trên nền trong suốt.
+    # Cao hơn bảng 1 pixel: các đường kẻ dọc vẽ tới cả y = BOARD_HEIGHT
+    panel = pygame.Surface((BOARD_WIDTH + 180, BOARD_HEIGHT + 1), pygame.SRCALPHA)
+    draw_panel(panel, pygame.Rect(0, 0, BOARD_WIDTH, BOARD_HEIGHT), "")
+    draw_panel(panel, pygame.Rect(BOARD_WIDTH + 20, 50, 160, 160), "NEXT")
+    draw_panel(panel, pygame.Rect(BOARD_WIDTH + 20, 230, 160, 80), "SCORE")
+    for y in range(ROWS): pygame.draw.line(panel, COLORS['grid'], (0, y * BLOCK), (BOARD_WIDTH, y * BLOCK))
+    for x in range(COLS): pygame.draw.line(panel, COLORS['grid'], (x * BLOCK, 0), (x * BLOCK, BOARD_HEIGHT))
+    return panel
+
+class Tetris(TetrisEngine):
+    # Lớp vẽ mỏng bọc quanh TetrisEngine: chỉ thêm particle, hiệu ứng xóa hàng và draw()
+    # Phần tĩnh nằm trong hai Layer (layers()): panel + lưới bảng vẽ một lần, và các ô đã khóa chỉ vẽ lại
+    # khi lock_piece đổi bảng hoặc khi thua; draw_dynamic() vẽ phần còn lại và trả về các vùng đã vẽ.
+    def __init__(self, offset_x=0, **kwargs):
         self.offset_x = offset_x
-        self.board = [[0]*COLS for _ in range(ROWS)]
-        self.score = 0
-        self.game_over = False
-        self.particles = []
+        self.particles = ParticlePool()
+        self._layers, self._board_key = None, None
         self.line_clear_animation = [] 
-        self.spawn_piece()
+        super().__init__(**kwargs)
         
     def spawn_piece(self):
-        self.piece_key = getattr(self, 'next_piece_key', random.choice(list(SHAPES.keys())))
-        self.next_piece_key = random.choice(list(SHAPES.keys()))
-        self.shape = SHAPES[self.piece_key]
+        super().spawn_piece()
         self.color = SHAPE_COLORS[self.piece_key]
-        self.x, self.y = COLS // 2 - len(self.shape[0]) // 2, 0
-        if check_collision(self.board, self.shape, (self.x, self.y)): self.game_over = True
-
-    def move(self, dx, dy):
-        if not self.game_over and not check_collision(self.board, self.shape, (self.x + dx, self.y + dy)):
-            self.x, self.y = self.x + dx, self.y + dy
-            return True
-        return False
+        self.previous_pos = None # Khối mới xuất hiện: không nội suy từ vị trí của khối trước
 
-    def rotate_piece(self):
-        if self.game_over: return
-        rotated = rotate(self.shape)
-        if not check_collision(self.board, rotated, (self.x, self.y)): self.shape = rotated
+    def begin_tick(self):
+        # Gọi trước mỗi tick luật chơi; khi vẽ, khối được nội suy giữa vị trí này và vị trí hiện tại
+        self.previous_pos = (self.x, self.y)
 
     def lock_piece(self):
-        for y, row in enumerate(self.shape):
-            for x, val in enumerate(row):
-                if val:
-                    block_x, block_y = self.offset_x + (self.x + x) * BLOCK + BLOCK // 2, (self.y + y) * BLOCK + BLOCK // 2
-                    for _ in range(3): self.particles.append(Particle(block_x, block_y, self.color))
+        for x, y in self.orientation.cells:
+            block_x, block_y = self.offset_x + (self.x + x) * BLOCK + BLOCK // 2, (self.y + y) * BLOCK + BLOCK // 2
+            self.particles.emit(block_x, block_y, self.color, 3)
         
-        for y, row in enumerate(self.shape):
-            for x, val in enumerate(row):
-                if val: self.board[y + self.y][x + self.x] = self.piece_key
-        
-        rows_to_clear = [i for i, row in enumerate(self.board) if all(row)]
-        if rows_to_clear:
-            self.board, cleared = clear_rows(self.board)
-            self.score += cleared * 100 * cleared
-            for r in rows_to_clear:
-                self.line_clear_animation.append({'y': r, 'timer': 0.2})
-                for x in range(COLS):
-                    for _ in range(5): self.particles.append(Particle(self.offset_x + x*BLOCK + BLOCK//2, r*BLOCK + BLOCK//2, (255,255,255)))
-
-        if not self.game_over: self.spawn_piece()
-
-    def update(self):
-        if not self.game_over and not self.move(0, 1): self.lock_piece()
+        rows_to_clear = super().lock_piece()
+        for r in rows_to_clear:
+            self.line_clear_animation.append({'y': r, 'timer': 0.2})
+            self.particles.emit(np.repeat(self.offset_x + np.arange(COLS) * BLOCK + BLOCK // 2, 5), r*BLOCK + BLOCK//2, (255, 255, 255), COLS * 5)
+        return rows_to_clear
     
+    def build_layers(self):
+        panel_layer = board_panel()
+        board_layer = pygame.Surface((BOARD_WIDTH, BOARD_HEIGHT)).convert()
+        board_layer.set_colorkey(SPRITE_COLORKEY, pygame.RLEACCEL)
+        # Surface RLE bị mã hóa lại sau mỗi lần blit vào nó: vẽ các khối lên tấm nháp thường rồi chép sang một lần
+        self._board_canvas = pygame.Surface((BOARD_WIDTH, BOARD_HEIGHT)).convert()
+        self._layers = [Layer(panel_layer, (self.offset_x, 0)), Layer(board_layer, (self.offset_x, 0))]
+
+    def layers(self):
+        if self._layers is None: self.build_layers()
+        board_layer = self._layers[1]
+        if self._board_key != (self.pieces, self.game_over):
+            self._board_key = (self.pieces, self.game_over)
+            canvas = self._board_canvas
+            canvas.fill(SPRITE_COLORKEY)
+            blits = []
+            for y, mask in enumerate(self.board.rows):
+                if not mask: continue
+                for x, cell in enumerate(self.board.cells[y]):
+                    if cell: blits.append((BLOCK_SPRITES[cell if not self.game_over else 'game_over', BLOCK], (x * BLOCK, y * BLOCK)))
+            canvas.blits(blits, doreturn=False)
+            board_layer.surface.blit(canvas, (0, 0))
+            board_layer.dirty = True
+        return self._layers
+
     def draw(self, surface, dt):
-        board_rect = pygame.Rect(self.offset_x, 0, BOARD_WIDTH, BOARD_HEIGHT)
+        # Vẽ đầy đủ không qua LayeredRenderer
+        for layer in self.layers(): surface.blit(layer.surface, layer.rect)
+        rects = self.draw_dynamic(surface)
+        self.update_effects(dt)
+        return rects
+
+    def update_effects(self, dt):
+        # Hiệu ứng chạy theo thời gian thực của khung hình, không theo tick luật chơi
+        self.particles.update(dt)
+        for anim in self.line_clear_animation[:]:
+            anim['timer'] -= dt
+            if anim['timer'] <= 0: self.line_clear_animation.remove(anim)
+
+    def piece_position(self, alpha=1.0):
+        # alpha: phần tick đã trôi qua kể từ tick cuối (xem FixedTimestep), dùng để nội suy vị trí khối
+        if not self.previous_pos or alpha >= 1: return self.x, self.y
+        return self.previous_pos[0] + (self.x - self.previous_pos[0]) * alpha, self.previous_pos[1] + (self.y - self.previous_pos[1]) * alpha
+
+    def view_key(self, alpha=1.0):
+        # Những gì draw_dynamic phụ thuộc vào (bảng đã khóa nằm trong layers()); None khi đang có hiệu ứng, vì khi đó khung nào cũng khác
+        if len(self.particles) or self.line_clear_animation: return None
+        return self.piece_position(alpha), self.rotation, self.piece_key, self.next_piece_key, self.score, self.game_over
+
+    def draw_dynamic(self, surface, alpha=1.0):
+        rects = []
         next_piece_rect = pygame.Rect(self.offset_x + BOARD_WIDTH + 20, 50, 160, 160)
         score_rect = pygame.Rect(self.offset_x + BOARD_WIDTH + 20, 230, 160, 80)
-        
-        draw_panel(surface, board_rect, "", font)
-        draw_panel(surface, next_piece_rect, "NEXT", font)
-        draw_panel(surface, score_rect, "SCORE", font)
-        
-        for y in range(ROWS): pygame.draw.line(surface, COLORS['grid'], (self.offset_x, y * BLOCK), (self.offset_x + BOARD_WIDTH, y * BLOCK))
-        for x in range(COLS): pygame.draw.line(surface, COLORS['grid'], (self.offset_x + x * BLOCK, 0), (self.offset_x + x * BLOCK, BOARD_HEIGHT))
-
-        for y, row in enumerate(self.board):
-            for x, cell in enumerate(row):
-                if cell: draw_detailed_block(surface, SHAPE_COLORS[cell] if not self.game_over else (80, 80, 80), pygame.Rect(self.offset_x + x * BLOCK, y * BLOCK, BLOCK, BLOCK))
 
         if not self.game_over:
-            ghost_y = self.y
-            while not check_collision(self.board, self.shape, (self.x, ghost_y + 1)): ghost_y += 1
-            for y, row in enumerate(self.shape):
-                for x, val in enumerate(row):
-                    if val: draw_detailed_block(surface, self.color, pygame.Rect(self.offset_x + (self.x + x) * BLOCK, (ghost_y + y) * BLOCK, BLOCK, BLOCK), is_ghost=True)
-            for y, row in enumerate(self.shape):
-                for x, val in enumerate(row):
-                    if val: draw_detailed_block(surface, self.color, pygame.Rect(self.offset_x + (self.x + x) * BLOCK, (self.y + y) * BLOCK, BLOCK, BLOCK))
+            px, py = self.piece_position(alpha)
+            ghost_y = drop_y(self.board, self.orientation, self.x, self.y)
+            ghost, sprite = BLOCK_SPRITES['ghost', BLOCK], BLOCK_SPRITES[self.piece_key, BLOCK]
+            blits = [(ghost, (self.offset_x + (px + x) * BLOCK, (ghost_y + y) * BLOCK)) for x, y in self.orientation.cells]
+            blits += [(sprite, (self.offset_x + (px + x) * BLOCK, (py + y) * BLOCK)) for x, y in self.orientation.cells]
+            piece_rects = surface.blits(blits)
+            rects.append(piece_rects[0].unionall(piece_rects))
         
-        for anim in self.line_clear_animation[:]:
-            anim['timer'] -= dt
-            if anim['timer'] <= 0: self.line_clear_animation.remove(anim)
-            else:
-                flash = pygame.Surface((BOARD_WIDTH, BLOCK)); flash.set_alpha(anim['timer'] / 0.2 * 200); flash.fill((255, 255, 255))
-                surface.blit(flash, (self.offset_x, anim['y'] * BLOCK))
+        for anim in self.line_clear_animation:
+            flash = pygame.Surface((BOARD_WIDTH, BLOCK)); flash.set_alpha(anim['timer'] / 0.2 * 200); flash.fill((255, 255, 255))
+            rects.append(surface.blit(flash, (self.offset_x, anim['y'] * BLOCK)))
         
-        for p in self.particles[:]:
-            p.draw(surface)
-            if not p.update(dt): self.particles.remove(p)
+        rects.append(self.particles.draw(surface))
 
-        next_shape = SHAPES[self.next_piece_key]; next_color = SHAPE_COLORS[self.next_piece_key]
-        scaled_block = BLOCK * 0.7
-        start_x, start_y = next_piece_rect.centerx - (len(next_shape[0]) * scaled_block) / 2, next_piece_rect.centery - (len(next_shape) * scaled_block) / 2 + 10
-        for y, row in enumerate(next_shape):
-            for x, val in enumerate(row):
-                if val: draw_detailed_block(surface, next_color, pygame.Rect(start_x + x * scaled_block, start_y + y * scaled_block, scaled_block, scaled_block))
+        next_shape, next_sprite = SHAPES[self.next_piece_key], BLOCK_SPRITES[self.next_piece_key, PREVIEW_BLOCK]
+        start_x, start_y = next_piece_rect.centerx - (len(next_shape[0]) * PREVIEW_BLOCK) / 2, next_piece_rect.centery - (len(next_shape) * PREVIEW_BLOCK) / 2 + 10
+        preview_rects = surface.blits([(next_sprite, (int(start_x + x * PREVIEW_BLOCK), int(start_y + y * PREVIEW_BLOCK)))
+                                       for y, row in enumerate(next_shape) for x, val in enumerate(row) if val])
+        rects.append(preview_rects[0].unionall(preview_rects))
 
-        score_font = pygame.font.Font("Roboto-Regular.ttf", 32)
-        score_surf = score_font.render(f"{self.score}", True, COLORS['text'])
-        surface.blit(score_surf, (score_rect.centerx - score_surf.get_width()/2, score_rect.centery))
+        score_surf = render_text(f"{self.score}", 32, COLORS['text'])
+        rects.append(surface.blit(score_surf, (score_rect.centerx - score_surf.get_width()/2, score_rect.centery)))
 
         if self.game_over:
-            over_font = pygame.font.Font("Roboto-Regular.ttf", 50)
-            retry_font = pygame.font.Font("Roboto-Regular.ttf", 24)
-            over_text = over_font.render("GAME OVER", True, COLORS['game_over'])
-            retry_text = retry_font.render("Press R to retry - Q to menu", True, COLORS['text'])
-            surface.blit(over_text, over_text.get_rect(center=(self.offset_x + BOARD_WIDTH/2, BOARD_HEIGHT/2 - 30)))
-            surface.blit(retry_text, retry_text.get_rect(center=(self.offset_x + BOARD_WIDTH/2, BOARD_HEIGHT/2 + 30)))
+            over_text = render_text("GAME OVER", 50, COLORS['game_over'])
+            retry_text = render_text("Press R to retry - Q to menu", 24, COLORS['text'])
+            rects.append(surface.blit(over_text, over_text.get_rect(center=(self.offset_x + BOARD_WIDTH/2, BOARD_HEIGHT/2 - 30))))
+            rects.append(surface.blit(retry_text, retry_text.get_rect(center=(self.offset_x + BOARD_WIDTH/2, BOARD_HEIGHT/2 + 30))))
+        return rects
 
 class TetrisAI(Tetris):
-    def __init__(self, offset_x=0):
-        super().__init__(offset_x)
+    def __init__(self, offset_x=0, planner=None, depth=2, beam_width=4, **kwargs):
+        super().__init__(offset_x, **kwargs)
         self.ai_mode = "idle"
-        self.ai_target_rot, self.ai_target_x = 0, 0
+        self.ai_plan = deque()
+        # Nhìn trước cả next_piece_key; mỗi quyết định đồng bộ gói trong 4ms để khung hình 60 fps không bị giật
+        self.search = ai.LookaheadAI(depth=depth, beam_width=beam_width, time_budget=0.004)
+        # planner (ai.AIPlanner): lập kế hoạch trên tiến trình nền. Kế hoạch cho khối kế tiếp được gửi đi ngay khi
+        # khối hiện tại nhận kế hoạch, trên bảng đoán trước sau khi nó khóa; lúc khối kế tiếp xuất hiện mà bảng
+        # hoặc vị trí khác với ảnh chụp đã gửi thì kế hoạch cũ bị bỏ và gửi lại. Lúc gửi chưa biết khối sau nó nên tiến trình
+        # nền trả về nước tốt nhất cho từng loại khối kế tiếp; khi khối xuất hiện, nước ứng với next_piece_key thật được chọn.
+        self.planner = planner
+        self.planner_config = None if planner is None else (depth, beam_width, planner.config[2])
+        self.pending = None # (khóa ảnh chụp, Future)
+        self.stale_plans, self.plan_waits, self.plan_errors = 0, 0, 0
 
     def update_ai(self, can_drop=True):
+        # Kế hoạch (chuỗi thao tác ngắn nhất tới vị trí đã chọn, có thể luồn/xoay kẹt) được tính một lần khi khối xuất hiện,
+        # sau đó mỗi tick chỉ thực hiện thao tác kế tiếp; bước rơi mềm và lúc thả đi theo nhịp can_drop
         if self.game_over: return
         if self.ai_mode == "idle":
-            self.ai_target_rot, self.ai_target_x = self.find_best_move()
-            self.ai_mode = "rotating"
-        elif self.ai_mode == "rotating":
-            if self.ai_target_rot > 0: self.rotate_piece(); self.ai_target_rot -= 1
-            else: self.ai_mode = "moving"
+            plan = self.find_best_plan() if self.planner is None else self.take_plan()
+            if plan is None: return # Kế hoạch nền chưa xong: khối đứng chờ ở vị trí xuất hiện, khung hình không bị chặn
+            self.ai_plan = deque(plan)
+            self.ai_mode = "moving"
         elif self.ai_mode == "moving":
-            if self.x < self.ai_target_x: self.move(1, 0)
-            elif self.x > self.ai_target_x: self.move(-1, 0)
-            else: self.ai_mode = "dropping"
+            action = self.ai_plan[0]
+            if action == DROP: self.ai_mode = "dropping"
+            elif action != MOVE_DOWN or can_drop:
+                self.ai_plan.popleft()
+                self.apply(action)
         elif self.ai_mode == "dropping":
             if can_drop:
                 if not self.move(0, 1):
                     self.lock_piece()
                     self.ai_mode = "idle"
 
-    def find_best_move(self):
-        best_score, best_rotation, best_x = -float('inf'), 0, 0
-        for r in range(4):
-            test_shape = self.shape
-            for _ in range(r): test_shape = rotate(test_shape)
-            for x in range(COLS - len(test_shape[0]) + 1):
-                y = 0
-                while not check_collision(self.board, test_shape, (x, y + 1)): y += 1
-                
-                temp_board = [row[:] for row in self.board]
-                for ty, row in enumerate(test_shape):
-                    for tx, val in enumerate(row):
-                        if val: temp_board[ty + y][tx + x] = 'X'
-                
-                score = self.evaluate_board(temp_board)
-                if score > best_score:
-                    best_score, best_rotation, best_x = score, r, x
-        return best_rotation, best_x
-
-    def evaluate_board(self, board):
-        heights = [next((r for r in range(ROWS) if board[r][c]), ROWS) for c in range(COLS)]
-        agg_height = sum(ROWS - h for h in heights)
-        completed_lines = sum(1 for row in board if all(row))
-        holes = sum(1 for c in range(COLS) for r in range(heights[c], ROWS) if not board[r][c])
-        bumpiness = sum(abs(heights[i] - heights[i+1]) for i in range(COLS-1))
-        return completed_lines * 0.76 - agg_height * 0.51 - holes * 0.35 - bumpiness * 0.18
+    def request_plan(self, board, piece_key, next_piece_key, x, y, rotation=0):
+        key = (tuple(board.rows), piece_key, x, y, rotation)
+        self.pending = (key, self.planner.submit(board, piece_key, next_piece_key, x, y, rotation, self.planner_config))
+
+    def take_plan(self):
+        # Tiến trình nền lỗi (pool hỏng, lỗi pickle, lỗi trong plan_snapshot): tự tìm đồng bộ thay vì làm sập vòng lặp game.
+        # Pool đã hỏng thì mọi lần gửi sau cũng lỗi, nên bảng này chuyển hẳn sang tìm đồng bộ.
+        try: return self._take_plan()
+        except Exception as e:
+            self.pending, self.plan_errors = None, self.plan_errors + 1
+            if isinstance(e, BrokenProcessPool): self.planner = None
+            print(f"AI planner error ({type(e).__name__}: {e}), falling back to synchronous search")
+            return self.find_best_plan()
+
+    def _take_plan(self):
+        key = (tuple(self.board.rows), self.piece_key, self.x, self.y, self.rotation)
+        if self.pending is not None and self.pending[0] != key:
+            self.pending[1].cancel()
+            self.pending, self.stale_plans = None, self.stale_plans + 1
+        if self.pending is None: self.request_plan(self.board, self.piece_key, self.next_piece_key, self.x, self.y, self.rotation)
+        future = self.pending[1]
+        if not future.done():
+            self.plan_waits += 1
+            return None
+        self.pending = None
+        placement = future.result()
+        if isinstance(placement, dict): placement = placement[self.next_piece_key] # Kế hoạch đoán trước
+        if placement is None: return (DROP,)
+        predicted = ai.predicted_spawn(self.board, self.piece_key, placement, self.next_piece_key)
+        if predicted is not None: self.request_plan(predicted[0], self.next_piece_key, None, predicted[1], predicted[2])
+        return placement.actions
+
+    def find_best_plan(self): return self.search.find_best_plan(self)
+    def evaluate_board(self, rows): return ai.evaluate_board(rows)
+
+# --- VÒNG LẶP NHỊP CỐ ĐỊNH VÀ PROFILER ---
+# Luật chơi (trọng lực, AI, phím giữ) chạy theo tick cố định TICK nên tốc độ game không trôi theo chi phí vẽ.
+# Khung hình chậm thì chạy bù nhiều tick trong một lượt (tối đa max_ticks, phần trễ hơn bị bỏ để không chậm dần);
+# alpha là phần tick còn dư, dùng để nội suy vị trí khối khi vẽ.
+TICK = 1 / 60
+
+class FixedTimestep:
+    def __init__(self, tick=TICK, max_ticks=5):
+        self.tick, self.max_ticks, self.accumulator = tick, max_ticks, 0.0
+
+    def advance(self, dt):
+        # Trả về số tick cần chạy cho khung hình vừa qua
+        self.accumulator += dt
+        ticks = int(self.accumulator / self.tick)
+        if ticks > self.max_ticks: ticks, self.accumulator = self.max_ticks, 0.0
+        else: self.accumulator -= ticks * self.tick
+        return ticks
+
+    @property
+    def alpha(self): return self.accumulator / self.tick
+
+# F4 bật/tắt bảng profiler, F5 ghi số liệu ra PROFILE_FILE (hoặc profile-<thời gian>.csv)
+PROFILER = metrics.FrameProfiler()
+PROFILE_FILE = None
+
+def dump_profile():
+    path = PROFILE_FILE or time.strftime("profile-%Y%m%d-%H%M%S.csv")
+    PROFILER.dump(path)
+    print(f"Profile: {PROFILER.frames} khung hình -> {path}")
+
+def handle_profiler_key(event):
+    if event.type != pygame.KEYDOWN: return
+    if event.key == pygame.K_F4: PROFILER.visible = not PROFILER.visible
+    elif event.key == pygame.K_F5: dump_profile()
+
+def draw_profiler(surface, renderer, ticks):
+    # renderer=None: chế độ vẽ lại cả màn hình mỗi khung (giải đấu)
+    dirty = renderer.updated_pixels / (WIDTH * HEIGHT) if renderer else 1
+    extra = (f"FPS {clock.get_fps():.0f}   ticks {ticks}", f"dirty {dirty:.0%}   text hit {text_cache.hit_rate:.0%}")
+    return surface.blit(PROFILER.draw(extra), (WIDTH - 280, 20))
 
 # --- CÁC CHẾ ĐỘ CHƠI VÀ MENU ---
+_planner = None
+
+def get_planner():
+    # Process pool lập kế hoạch cho AI: tạo lần đầu khi vào một chế độ có AI, dùng lại cho mọi ván sau
+    global _planner
+    if _planner is None: _planner = ai.AIPlanner()
+    return _planner
+
+def release_planner():
+    # Rời chế độ có AI: dừng các tiến trình con thay vì để chúng sống tới khi thoát game; lần sau get_planner() tạo lại
+    global _planner
+    if _planner is not None: _planner.shutdown()
+    _planner = None
+
+def new_game(cls, **kwargs):
+    if RECORD_DIR: return replay.new_recorded_game(cls, PIECE_MODE, **kwargs)
+    return cls(generator=PieceGenerator(mode=PIECE_MODE), **kwargs)
+
 def draw_menu(surface, selected, grid_offset):
     draw_animated_grid_bg(surface, grid_offset)
-    title_font, pulse = pygame.font.Font("Roboto-Regular.ttf", 90), (math.sin(pygame.time.get_ticks() * 0.002) + 1) / 2
+    pulse = (math.sin(pygame.time.get_ticks() * 0.002) + 1) / 2
+    # Màu được làm tròn về số nguyên nên chỉ có vài chục biến thể, bộ đệm chữ dùng lại được qua các chu kỳ
     glow_color = (100, COLORS['glow_text'][1] * (0.8 + pulse * 0.2), COLORS['glow_text'][2] * (0.8 + pulse * 0.2))
     
-    title_surf = title_font.render("TETRIS", True, COLORS['text'])
-    glow_surf = title_font.render("TETRIS", True, glow_color)
+    title_surf = render_text("TETRIS", 90, COLORS['text'])
+    glow_surf = render_text("TETRIS", 90, glow_color)
     for i in range(4, 0, -1):
         temp_glow = glow_surf.copy(); temp_glow.set_alpha(50 // i)
         surface.blit(temp_glow, (WIDTH/2 - temp_glow.get_width()/2, HEIGHT/4 - temp_glow.get_height()/2 + i*2))
     surface.blit(title_surf, (WIDTH/2 - title_surf.get_width()/2, HEIGHT/4 - title_surf.get_height()/2))
     surface.blit(logo_img, (WIDTH/2 - logo_img.get_width()/2, 20))
 
-    options = ["1. Solo with Hand Control", "2. Solo vs AI (Keyboard)"]
-    for i, text in enumerate(options):
-        op_font = pygame.font.Font("Roboto-Regular.ttf", int(FONT_SIZE * (1.5 if selected == i else 1.2)))
+    for i, (text, _) in enumerate(MENU_OPTIONS):
         color = COLORS['glow_text'] if selected == i else COLORS['text']
         prefix, suffix = ("> " if selected == i else ""), (" <" if selected == i else "")
-        option_surf = op_font.render(prefix + text + suffix, True, color)
+        option_surf = render_text(prefix + text + suffix, int(FONT_SIZE * (1.5 if selected == i else 1.2)), color)
         surface.blit(option_surf, option_surf.get_rect(center=(WIDTH/2, HEIGHT/2 + 50 + i * 70)))
 
+MENU_OPTIONS = [("1. Solo with Hand Control", 'solo'), ("2. Solo vs AI (Keyboard)", 'ai'), ("3. AI Tournament", 'tournament')]
+
 def menu_loop():
     selected, grid_offset = 0, 0
     while True:
@@ -271,90 +402,132 @@ def menu_loop():
         for event in pygame.event.get():
             if event.type == pygame.QUIT: pygame.quit(); exit()
             if event.type == pygame.KEYDOWN:
-                if event.key in (pygame.K_DOWN, pygame.K_s): selected = (selected + 1) % 2
-                elif event.key in (pygame.K_UP, pygame.K_w): selected = (selected - 1 + 2) % 2
-                elif event.key == pygame.K_RETURN: return 'solo' if selected == 0 else 'ai'
-        win.fill(COLORS['background']); draw_menu(win, selected, grid_offset); pygame.display.flip(); clock.tick(60)
+                if event.key in (pygame.K_DOWN, pygame.K_s): selected = (selected + 1) % len(MENU_OPTIONS)
+                elif event.key in (pygame.K_UP, pygame.K_w): selected = (selected - 1) % len(MENU_OPTIONS)
+                elif event.key == pygame.K_RETURN: return MENU_OPTIONS[selected][1]
+        draw_menu(win, selected, grid_offset); pygame.display.flip(); clock.tick(60)
 
 # File: test.py
 # TÌM HÀM solo_mode() CŨ VÀ THAY THẾ TOÀN BỘ BẰNG HÀM NÀY
 
 def solo_mode():
-    tracker = HandTracker()
+    start = time.perf_counter()
+    try: tracker = HandTracker(inference_width=HAND_INFERENCE_WIDTH, roi=HAND_ROI, debug=HAND_DEBUG, motion_gate=MotionGate() if HAND_SKIP else None) # Lần đầu: chờ warm_up() nạp xong model (hoặc tự nạp nếu chưa chạy)
+    except OSError as e:
+        print(f"Error: {e}") # Không có webcam: quay lại menu thay vì thoát game
+        return
+    print(f"Hand tracker sẵn sàng sau {(time.perf_counter() - start) * 1000:.0f} ms (nạp model {hand_control.hands_load_time * 1000:.0f} ms)")
+    latency = metrics.LatencyStats(keep=36000 if LATENCY_FILE else 0) # Chỉ giữ từng dòng khi cần ghi ra file
     try:
         # === KHỞI TẠO CÁC BỘ PHÁT HIỆN ===
-        move_detector = MoveDetector()
+        move_detector = MoveDetector(10, smoothed=True, lead=HAND_LEAD) if HAND_SMOOTHING else MoveDetector()
         wave_detector = WaveDetector()
         tap_detector = FingerTapDetector()
         # THÊM bộ phát hiện thả khối mới
-        drop_detector = DropDetector()
+        drop_detector = DropDetector(12, smoothed=True, lead=HAND_LEAD) if HAND_SMOOTHING else DropDetector()
         # BỎ ĐI fist_detector
         
         game_is_running = True
         while game_is_running:
-            game = Tetris(offset_x=(WIDTH - BOARD_WIDTH) / 2 - 100)
+            game = new_game(Tetris, offset_x=(WIDTH - BOARD_WIDTH) / 2 - 100)
+            renderer = LayeredRenderer(win, BACKGROUND)
+            timestep = FixedTimestep()
             fall_speed, fall_time, move_delay, move_timer = 0.5, 0, 0.12, 0
             
             in_game = True
             while in_game:
                 dt = clock.tick(60) / 1000
-                fall_time, move_timer = fall_time + dt, move_timer + dt
 
                 # Reset các hành động ở mỗi vòng lặp
                 gesture, movement, drop_action = "None", "None", "None"
 
-                if tracker.update():
-                    # === LẤY CÁC HÀNH ĐỘNG TỪ BỘ PHÁT HIỆN ===
-                    # 1. Lấy chuyển động ngang
-                    movement = move_detector.detect(tracker)
-                    # 2. Lấy hành động thả khối (đi xuống)
-                    drop_action = drop_detector.detect(tracker)
-                    # 3. Lấy các cử chỉ đặc biệt (vẫy tay, xoay)
-                    gestures = [
-                        wave_detector.detect(tracker),
-                        tap_detector.detect(tracker)
-                    ]
-                    gesture = next((g for g in gestures if g != "None"), "None")
-
-                for event in pygame.event.get():
-                    if event.type == pygame.QUIT: in_game, game_is_running = False, False
-                    if game.game_over and event.type == pygame.KEYDOWN:
-                        if event.key == pygame.K_q: in_game, game_is_running = False, False
-                        elif event.key == pygame.K_r: in_game = False
-
-                if not game.game_over:
-                    # Xử lý di chuyển ngang
-                    if movement == "Move Left" and move_timer > move_delay:
-                        game.move(-1, 0); move_timer = 0
-                    elif movement == "Move Right" and move_timer > move_delay:
-                        game.move(1, 0); move_timer = 0
-                    
-                    # Xử lý xoay khối
-                    if gesture == "Tap (Rotate)":
-                        game.rotate_piece()
-
-                    # === XỬ LÝ THẢ KHỐI BẰNG HÀNH ĐỘNG MỚI ===
-                    if drop_action == "Drop Down":
-                        game.update() # Gọi update() để khối rơi xuống 1 nấc
-                    
-                    # Tự động rơi xuống theo thời gian
-                    if fall_time > fall_speed: 
-                        game.update()
-                        fall_time = 0
+                with PROFILER.section('tracker'):
+                    new_frame = tracker.update()
+                    if new_frame:
+                        detect_start = time.perf_counter()
+                        # === LẤY CÁC HÀNH ĐỘNG TỪ BỘ PHÁT HIỆN ===
+                        # 1. Lấy chuyển động ngang
+                        movement = move_detector.detect(tracker)
+                        # 2. Lấy hành động thả khối (đi xuống)
+                        drop_action = drop_detector.detect(tracker)
+                        # 3. Lấy các cử chỉ đặc biệt (vẫy tay, xoay)
+                        gestures = [
+                            wave_detector.detect(tracker),
+                            tap_detector.detect(tracker)
+                        ]
+                        gesture = next((g for g in gestures if g != "None"), "None")
+                        stage_times = {**tracker.stage_times, 'detect': time.perf_counter() - detect_start}
+
+                with PROFILER.section('input'):
+                    for event in pygame.event.get():
+                        if event.type == pygame.QUIT: in_game, game_is_running = False, False
+                        if event.type == pygame.KEYDOWN and event.key == pygame.K_F3: tracker.set_debug(not tracker.debug)
+                        if event.type == pygame.WINDOWEXPOSED: renderer.invalidate()
+                        handle_profiler_key(event)
+                        if game.game_over and event.type == pygame.KEYDOWN:
+                            if event.key == pygame.K_q: in_game, game_is_running = False, False
+                            elif event.key == pygame.K_r: in_game = False
+
+                with PROFILER.section('rules'):
+                    # Cử chỉ được áp ngay khi nhận diện xong để không cộng thêm độ trễ chờ tick
+                    if not game.game_over:
+                        apply_start, acted = time.perf_counter(), True
+                        # Xử lý di chuyển ngang
+                        if movement == "Move Left" and move_timer > move_delay:
+                            game.move(-1, 0); move_timer = 0
+                        elif movement == "Move Right" and move_timer > move_delay:
+                            game.move(1, 0); move_timer = 0
+                        else: acted = False
+                        
+                        # Xử lý xoay khối
+                        if gesture == "Tap (Rotate)":
+                            game.rotate_piece(); acted = True
+
+                        # === XỬ LÝ THẢ KHỐI BẰNG HÀNH ĐỘNG MỚI ===
+                        if drop_action == "Drop Down":
+                            game.update(); acted = True # Gọi update() để khối rơi xuống 1 nấc
+
+                        if new_frame and acted:
+                            now = time.perf_counter()
+                            stage_times['apply'], stage_times['total'] = now - apply_start, now - tracker.timestamp
+
+                    # Tick luật chơi: bộ đếm thời gian và tự động rơi xuống
+                    ticks = timestep.advance(dt)
+                    for _ in range(ticks):
+                        game.begin_tick(); game.tick()
+                        fall_time, move_timer = fall_time + TICK, move_timer + TICK
+                        if fall_time > fall_speed and not game.game_over:
+                            game.update()
+                            fall_time = 0
+
+                if new_frame: latency.record(tracker.timestamp, stage_times)
 
                 # Chơi lại bằng cử chỉ vẫy tay
                 if gesture == "Wave (Play Again)" and game.game_over:
                     in_game = False
 
                 # Vẽ mọi thứ lên màn hình
-                win.fill(COLORS['background'])
-                draw_animated_grid_bg(win, pygame.time.get_ticks() * 0.01)
-                game.draw(win, dt)
-                win.blit(tracker.draw_debug_info(gesture, movement), (20, HEIGHT - 170))
-                tracker.show_frame()
-                pygame.display.flip()
+                with PROFILER.section('draw'):
+                    renderer.begin(pygame.time.get_ticks() * 0.01, game.layers())
+                    rects = game.draw_dynamic(win, timestep.alpha)
+                    if tracker.debug:
+                        rects.append(win.blit(tracker.draw_debug_info(gesture, movement), (20, HEIGHT - 230)))
+                        rects.append(win.blit(latency.draw(), (20, HEIGHT - 450)))
+                        tracker.show_frame(move_detector)
+                    if PROFILER.visible: rects.append(draw_profiler(win, renderer, ticks))
+                with PROFILER.section('particles'): game.update_effects(dt)
+                with PROFILER.section('flip'): renderer.end(rects)
+                PROFILER.end_frame(ticks)
+            if RECORD_DIR: replay.save_game(game, RECORD_DIR, "solo")
     finally:
         tracker.release()
+        total = tracker.frames_inferred + tracker.frames_skipped
+        if total: print(f"Nhận diện tay: {tracker.frames_inferred} khung suy luận, {tracker.frames_skipped} khung bỏ qua ({tracker.frames_skipped / total:.0%})")
+        if PROFILE_FILE: dump_profile()
+        if LATENCY_FILE:
+            latency.export(LATENCY_FILE)
+            for stage, stats in latency.summary().items():
+                print(f"{stage:<8} n={stats['count']:<6} p50 {stats['p50']:.1f} ms  p95 {stats['p95']:.1f} ms  p99 {stats['p99']:.1f} ms")
 def vs_ai_mode():
     game_is_running = True
     while game_is_running:
@@ -363,7 +536,9 @@ def vs_ai_mode():
         player_x = start_x
         ai_x = start_x + BOARD_WIDTH + 180 + 50
         
-        player_game, ai_game = Tetris(offset_x=player_x), TetrisAI(offset_x=ai_x)
+        player_game, ai_game = new_game(Tetris, offset_x=player_x), new_game(TetrisAI, offset_x=ai_x, planner=get_planner())
+        renderer = LayeredRenderer(win, BACKGROUND)
+        timestep = FixedTimestep()
         fall_speed, player_fall_time, move_delay, move_timer = 0.4, 0, 0.1, 0
         ai_drop_speed, ai_drop_timer = 0.05, 0 # AI moves very fast
         
@@ -372,61 +547,185 @@ def vs_ai_mode():
         in_game = True
         while in_game:
             dt = clock.tick(60) / 1000
-            player_fall_time, move_timer, ai_drop_timer = player_fall_time + dt, move_timer + dt, ai_drop_timer + dt
-            
-            # AI Logic
-            ai_game.update_ai(can_drop=(ai_drop_timer > ai_drop_speed))
             
             # Player Logic
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT: in_game, game_is_running = False, False
-                if player_game.game_over and event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_q: in_game, game_is_running = False, False
-                    elif event.key == pygame.K_r: in_game = False
-                if not player_game.game_over and event.type == pygame.KEYDOWN:
-                    if event.key in (pygame.K_UP, pygame.K_w): player_game.rotate_piece()
+            with PROFILER.section('input'):
+                for event in pygame.event.get():
+                    if event.type == pygame.QUIT: in_game, game_is_running = False, False
+                    if event.type == pygame.WINDOWEXPOSED: renderer.invalidate()
+                    handle_profiler_key(event)
+                    if player_game.game_over and event.type == pygame.KEYDOWN:
+                        if event.key == pygame.K_q: in_game, game_is_running = False, False
+                        elif event.key == pygame.K_r: in_game = False
+                    if not player_game.game_over and event.type == pygame.KEYDOWN:
+                        if event.key in (pygame.K_UP, pygame.K_w): player_game.rotate_piece()
+                keys = pygame.key.get_pressed()
             
-            keys = pygame.key.get_pressed()
-            if not player_game.game_over:
-                if keys[pygame.K_LEFT] and move_timer > move_delay: player_game.move(-1, 0); move_timer = 0
-                if keys[pygame.K_RIGHT] and move_timer > move_delay: player_game.move(1, 0); move_timer = 0
-                if keys[pygame.K_DOWN]: player_game.update()
-            if player_fall_time > fall_speed: player_game.update(); player_fall_time = 0
+            # Tick luật chơi cố định cho cả AI và người chơi
+            ticks = timestep.advance(dt)
+            for _ in range(ticks):
+                with PROFILER.section('ai'):
+                    ai_game.begin_tick(); ai_game.tick()
+                    ai_drop_timer += TICK
+                    ai_game.update_ai(can_drop=(ai_drop_timer > ai_drop_speed))
+                with PROFILER.section('rules'):
+                    player_game.begin_tick(); player_game.tick()
+                    player_fall_time, move_timer = player_fall_time + TICK, move_timer + TICK
+                    if not player_game.game_over:
+                        if keys[pygame.K_LEFT] and move_timer > move_delay: player_game.move(-1, 0); move_timer = 0
+                        if keys[pygame.K_RIGHT] and move_timer > move_delay: player_game.move(1, 0); move_timer = 0
+                        if keys[pygame.K_DOWN]: player_game.update()
+                    if player_fall_time > fall_speed: player_game.update(); player_fall_time = 0
             
             # Trash Talk Logic
-            last_trash_talk_time += dt
-            if ai_game.score > player_game.score + 200 and last_trash_talk_time > trash_talk_interval:
-                current_trash_msg, last_trash_talk_time, msg_alpha = random.choice(TRASH_TALK_LINES), 0, 255
-            if msg_alpha > 0: msg_alpha -= 100 * dt
+            with PROFILER.section('rules'):
+                last_trash_talk_time += dt
+                if ai_game.score > player_game.score + 200 and last_trash_talk_time > trash_talk_interval:
+                    current_trash_msg, last_trash_talk_time, msg_alpha = random.choice(TRASH_TALK_LINES), 0, 255
+                if msg_alpha > 0: msg_alpha -= 100 * dt
 
             # Drawing
-            win.fill(COLORS['background']); draw_animated_grid_bg(win, pygame.time.get_ticks() * 0.01)
-            player_game.draw(win, dt); ai_game.draw(win, dt)
+            with PROFILER.section('draw'):
+                renderer.begin(pygame.time.get_ticks() * 0.01, player_game.layers() + ai_game.layers())
+                rects = player_game.draw_dynamic(win, timestep.alpha) + ai_game.draw_dynamic(win, timestep.alpha)
             
-            # Labels
-            label_font = pygame.font.Font("Roboto-Regular.ttf", 40)
-            player_label = label_font.render("YOU", True, (50, 200, 255))
-            ai_label = label_font.render("AI", True, (255, 100, 100))
-            win.blit(player_label, player_label.get_rect(midbottom=(player_x + BOARD_WIDTH/2, -5)))
-            win.blit(ai_label, ai_label.get_rect(midbottom=(ai_x + BOARD_WIDTH/2, -5)))
-
-            # Trash talk bubble
-            if msg_alpha > 0:
-                bubble_font = pygame.font.Font("Roboto-Regular.ttf", 22)
-                text = bubble_font.render(current_trash_msg, True, COLORS['game_over'])
-                text_rect = text.get_rect(center=(WIDTH/2, HEIGHT - 50))
-                bubble_rect = text_rect.inflate(20, 10) # Tăng kích thước thêm 20px chiều rộng, 10px chiều cao
-                bubble_surf = pygame.Surface(bubble_rect.size, pygame.SRCALPHA)
-                bubble_surf.set_alpha(msg_alpha)
-                pygame.draw.rect(bubble_surf, COLORS['panel_bg'], (0, 0, *bubble_rect.size), border_radius=10)
-                pygame.draw.rect(bubble_surf, COLORS['game_over'], (0, 0, *bubble_rect.size), 2, border_radius=10)
-                bubble_surf.blit(text, text.get_rect(center=(bubble_rect.width/2, bubble_rect.height/2)))
-                win.blit(bubble_surf, bubble_rect)
+                # Labels
+                player_label = render_text("YOU", 40, (50, 200, 255))
+                ai_label = render_text("AI", 40, (255, 100, 100))
+                rects.append(win.blit(player_label, player_label.get_rect(midbottom=(player_x + BOARD_WIDTH/2, -5))))
+                rects.append(win.blit(ai_label, ai_label.get_rect(midbottom=(ai_x + BOARD_WIDTH/2, -5))))
+
+                # Trash talk bubble
+                if msg_alpha > 0:
+                    text = render_text(current_trash_msg, 22, COLORS['game_over'])
+                    text_rect = text.get_rect(center=(WIDTH/2, HEIGHT - 50))
+                    bubble_rect = text_rect.inflate(20, 10) # Tăng kích thước thêm 20px chiều rộng, 10px chiều cao
+                    bubble_surf = pygame.Surface(bubble_rect.size, pygame.SRCALPHA)
+                    bubble_surf.set_alpha(msg_alpha)
+                    pygame.draw.rect(bubble_surf, COLORS['panel_bg'], (0, 0, *bubble_rect.size), border_radius=10)
+                    pygame.draw.rect(bubble_surf, COLORS['game_over'], (0, 0, *bubble_rect.size), 2, border_radius=10)
+                    bubble_surf.blit(text, text.get_rect(center=(bubble_rect.width/2, bubble_rect.height/2)))
+                    rects.append(win.blit(bubble_surf, bubble_rect))
+                if PROFILER.visible: rects.append(draw_profiler(win, renderer, ticks))
             
-            pygame.display.flip()
+            with PROFILER.section('particles'): player_game.update_effects(dt); ai_game.update_effects(dt)
+            with PROFILER.section('flip'): renderer.end(rects)
+            PROFILER.end_frame(ticks)
+        if RECORD_DIR:
+            replay.save_game(player_game, RECORD_DIR, "player")
+            replay.save_game(ai_game, RECORD_DIR, "ai")
+    if PROFILE_FILE: dump_profile()
+
+# --- GIẢI ĐẤU AI ---
+# N bảng AI chơi cùng một dãy khối, mỗi bảng một cấu hình tìm kiếm. Mọi quyết định chạy trên process pool
+# nên số bảng không làm chậm khung hình; mỗi bảng được vẽ đầy đủ lên một tấm nháp rồi thu nhỏ vào ô lưới.
+TOURNAMENT_CONFIGS = [(1, 1), (2, 2), (2, 4), (3, 4)] # (depth, beam_width), lặp lại khi có nhiều bảng hơn
+TOURNAMENT_BOARDS = 4 # Đặt bằng --boards
+TOURNAMENT_DROP_TICKS = 2 # Số tick cho mỗi bước rơi của khối AI
+
+def tournament_layout(n):
+    # (số cột, tỉ lệ thu nhỏ) lớn nhất để n bảng kèm panel vừa màn hình; mỗi hàng chừa 40px cho nhãn, đáy chừa 30px.
+    # Tỉ lệ làm tròn xuống thành phân số mẫu nhỏ (p/24) để tournament_mode thu nhỏ lại được từng vùng (scale_region).
+    width, height = BOARD_WIDTH + 180, BOARD_HEIGHT + 1
+    best = (1, 0)
+    for cols in range(1, n + 1):
+        rows = -(-n // cols)
+        scale = min(WIDTH / cols / width, ((HEIGHT - 30) / rows - 40) / height, 1)
+        if scale > best[1]: best = (cols, scale)
+    return best[0], Fraction(max(math.floor(best[1] * 24), 1), 24)
+
+def tournament_mode(n=None):
+    n = n or TOURNAMENT_BOARDS
+    cols, scale = tournament_layout(n)
+    # Mỗi bảng vẽ lên tấm riêng theo vùng bẩn (LayeredRenderer không đẩy lên màn hình) và chỉ các vùng đó được thu nhỏ lại
+    # vào ảnh của bảng; bảng không đổi gì từ khung trước (view_key, Layer.dirty) thì dùng lại nguyên ảnh cũ.
+    # Kích thước tấm được làm tròn lên bội của mẫu số tỉ lệ để scale_region cho kết quả giống hệt thu nhỏ cả tấm.
+    # Panel (Layer trong suốt, không bao giờ đổi) được trộn sẵn vào nền một lần, chỉ còn lớp các ô đã khóa là Layer.
+    q = scale.denominator
+    size = (-(-(BOARD_WIDTH + 180) // q) * q, -(-(BOARD_HEIGHT + 1) // q) * q)
+    canvases = [pygame.Surface(size).convert() for _ in range(n)]
+    cell = (size[0] * scale.numerator // q, size[1] * scale.numerator // q)
+    scaled = [pygame.Surface(cell).convert() for _ in range(n)]
+    backdrop = pygame.Surface(size).convert()
+    backdrop.fill(COLORS['background'])
+    backdrop.blit(board_panel(), (0, 0))
+    renderers = [LayeredRenderer(canvas, StaticBackground(backdrop), display=False) for canvas in canvases]
+    x0 = (WIDTH - cols * cell[0]) // 2
+    positions = [(x0 + (i % cols) * cell[0], 40 + (i // cols) * (cell[1] + 40)) for i in range(n)]
+    game_is_running = True
+    while game_is_running:
+        seed = random.randrange(2**32)
+        configs = [TOURNAMENT_CONFIGS[i % len(TOURNAMENT_CONFIGS)] for i in range(n)]
+        games = [TetrisAI(generator=PieceGenerator(seed, PIECE_MODE), planner=get_planner(), depth=d, beam_width=b) for d, b in configs]
+        timestep, tick_count = FixedTimestep(), 0
+        views = [None] * n
+        for renderer in renderers: renderer.invalidate()
+
+        in_game = True
+        while in_game:
+            dt = clock.tick(60) / 1000
+            finished = all(game.game_over for game in games)
+            with PROFILER.section('input'):
+                for event in pygame.event.get():
+                    if event.type == pygame.QUIT: in_game, game_is_running = False, False
+                    handle_profiler_key(event)
+                    if event.type == pygame.KEYDOWN:
+                        if event.key == pygame.K_q: in_game, game_is_running = False, False
+                        elif event.key == pygame.K_r and finished: in_game = False
+
+            ticks = timestep.advance(dt)
+            with PROFILER.section('ai'):
+                for _ in range(ticks):
+                    tick_count += 1
+                    for game in games:
+                        game.begin_tick(); game.tick()
+                        game.update_ai(can_drop=tick_count % TOURNAMENT_DROP_TICKS == 0)
+
+            with PROFILER.section('draw'):
+                BACKGROUND.draw(win, pygame.time.get_ticks() * 0.01)
+                for i, (game, (depth, beam)) in enumerate(zip(games, configs)):
+                    layers, view = game.layers()[1:], game.view_key(timestep.alpha)
+                    if view is None or view != views[i] or any(layer.dirty for layer in layers):
+                        views[i] = view
+                        renderers[i].begin(0, layers)
+                        for rect in renderers[i].end(game.draw_dynamic(canvases[i], timestep.alpha)): scale_region(canvases[i], scaled[i], rect, scale)
+                    win.blit(scaled[i], positions[i])
+                    label = render_text(f"#{i + 1}  depth {depth} beam {beam}   {game.score}", 18, COLORS['glow_text'] if not game.game_over else COLORS['game_over'])
+                    win.blit(label, (positions[i][0] + 8, positions[i][1] - 26))
+                status = f"plans {get_planner().submitted}   stale {sum(g.stale_plans for g in games)}   waits {sum(g.plan_waits for g in games)}   errors {sum(g.plan_errors for g in games)}   Q: menu"
+                win.blit(render_text(status, 16, COLORS['text']), (20, HEIGHT - 24))
+                if PROFILER.visible: draw_profiler(win, None, ticks)
+            with PROFILER.section('particles'):
+                for game in games: game.update_effects(dt)
+            with PROFILER.section('flip'): pygame.display.flip()
+            PROFILER.end_frame(ticks)
+    if PROFILE_FILE: dump_profile()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Neon Tetris")
+    parser.add_argument("--bag", action="store_true", help="dùng bộ sinh khối 7-bag thay vì ngẫu nhiên đều")
+    parser.add_argument("--record", metavar="DIR", help="ghi mỗi ván thành file replay trong thư mục DIR")
+    parser.add_argument("--debug", action="store_true", help="hiện cửa sổ camera và bảng debug nhận diện tay")
+    parser.add_argument("--latency", metavar="FILE", help="ghi độ trễ từng công đoạn của chế độ solo ra FILE (.csv hoặc .json)")
+    parser.add_argument("--profile", metavar="FILE", help="ghi thời gian từng hệ con mỗi khung hình ra FILE (.csv hoặc .json) khi rời chế độ chơi hoặc nhấn F5")
+    parser.add_argument("--boards", type=int, default=TOURNAMENT_BOARDS, help="số bảng AI trong chế độ giải đấu")
+    parser.add_argument("--raw-hand", action="store_true", help="nhận diện di chuyển/thả khối trên tâm tay thô (không lọc, ngưỡng cũ)")
+    parser.add_argument("--no-skip", action="store_true", help="chạy nhận diện tay trên mọi khung hình, kể cả khi camera đứng yên")
+    parser.add_argument("--inference-width", type=int, metavar="N", help="thu nhỏ ảnh camera về bề rộng N px trước khi nhận diện tay")
+    parser.add_argument("--roi", action="store_true", help="chỉ nhận diện tay trên vùng quanh bàn tay ở khung trước")
+    parser.add_argument("--no-warmup", action="store_true", help="không nạp sẵn model nhận diện tay trên luồng nền khi đang ở menu")
+    args = parser.parse_args()
+    PIECE_MODE, RECORD_DIR, HAND_DEBUG, LATENCY_FILE = ('bag' if args.bag else 'uniform'), args.record, args.debug, args.latency
+    PROFILE_FILE, TOURNAMENT_BOARDS, HAND_SMOOTHING, HAND_SKIP = args.profile, args.boards, not args.raw_hand, not args.no_skip
+    HAND_INFERENCE_WIDTH, HAND_ROI = args.inference_width, args.roi
+    imported = time.perf_counter()
+    init_display()
+    print(f"Khởi động: {(time.perf_counter() - STARTUP_START) * 1000:.0f} ms (import {(imported - STARTUP_START) * 1000:.0f} ms, "
+          f"cửa sổ + tài nguyên {(time.perf_counter() - imported) * 1000:.0f} ms)")
+    if not args.no_warmup: hand_control.warm_up()
     while True:
         mode = menu_loop()
         if mode == 'solo': solo_mode()
-        elif mode == 'ai': vs_ai_mode()
\ No newline at end of file
+        elif mode == 'ai': vs_ai_mode()
+        elif mode == 'tournament': tournament_mode()
+        release_planner()
\ No newline at end of file
@@ -0,0 +1,155 @@
+# metrics.py
+# Đo độ trễ đầu vào từ lúc camera chụp khung hình đến lúc hành động được áp vào game.
+# Mỗi khung hình camera là một dòng: thời gian (ms) của từng công đoạn, 'total' = từ lúc chụp đến khi
+# game.move/rotate_piece/update chạy xong (chỉ có ở khung hình sinh ra hành động).
+# Bảng phủ hiển thị p50/p95/p99 trên cửa sổ các mẫu gần nhất; export() ghi tối đa `keep` khung gần nhất ra CSV hoặc JSON
+# (keep=0: không giữ dòng nào, chỉ có bảng phủ).
+# FrameProfiler đo thời gian mỗi khung hình của vòng lặp game theo từng hệ con (input, tracker, AI, ...).
+import csv
+import json
+import time
+from collections import deque
+from contextlib import contextmanager
+import numpy as np
+import pygame
+from render import render_text
+
+LATENCY_STAGES = ('read', 'convert', 'process', 'wait', 'detect', 'apply', 'total')
+PERCENTILES = (50, 95, 99)
+
+class LatencyStats:
+    def __init__(self, stages=LATENCY_STAGES, window=600, keep=36000):
+        self.stages, self.window = stages, window
+        self.recent = {stage: np.zeros(window) for stage in stages} # Bộ đệm vòng (ms) cho bảng phủ
+        self.counts = dict.fromkeys(stages, 0)
+        self.rows = deque(maxlen=keep) # (thời điểm chụp, {công đoạn: ms}) của `keep` khung gần nhất
+        self._surface = None
+
+    def record(self, timestamp, stage_times):
+        # stage_times: {công đoạn: giây}; công đoạn vắng mặt được để trống
+        row = {}
+        for stage, seconds in stage_times.items():
+            if stage not in self.recent: continue
+            ms = row[stage] = seconds * 1000
+            self.recent[stage][self.counts[stage] % self.window] = ms
+            self.counts[stage] += 1
+        self.rows.append((timestamp, row))
+
+    def samples(self, stage): return self.recent[stage][:min(self.counts[stage], self.window)]
+
+    def percentiles(self, stage):
+        samples = self.samples(stage)
+        return tuple(np.percentile(samples, PERCENTILES)) if len(samples) else None
+
+    def summary(self):
+        # Thống kê trên mọi dòng đã giữ (không chỉ cửa sổ của bảng phủ)
+        result = {}
+        for stage in self.stages:
+            values = np.array([row[stage] for _, row in self.rows if stage in row])
+            if not len(values): continue
+            p = np.percentile(values, PERCENTILES)
+            result[stage] = {'count': len(values), 'mean': float(values.mean()), 'max': float(values.max()),
+                             **{f'p{q}': float(v) for q, v in zip(PERCENTILES, p)}}
+        return result
+
+    def export(self, path):
+        # Đuôi .json: tóm tắt + từng khung hình; còn lại: CSV mỗi dòng một khung hình
+        start = self.rows[0][0] if self.rows else 0
+        if path.endswith('.json'):
+            frames = [{'time': t - start, **row} for t, row in self.rows]
+            with open(path, 'w') as f: json.dump({'summary': self.summary(), 'frames': frames}, f, indent=2)
+            return
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(('time',) + self.stages)
+            for t, row in self.rows:
+                writer.writerow([f'{t - start:.4f}'] + [f'{row[s]:.3f}' if s in row else '' for s in self.stages])
+
+    def draw(self, width=340, bins=24):
+        # Mỗi công đoạn một dòng: p50/p95/p99 (ms) và biểu đồ phân bố nhỏ của các mẫu gần nhất
+        height = 40 + 24 * len(self.stages)
+        if self._surface is None: self._surface = pygame.Surface((width, height), pygame.SRCALPHA)
+        surface = self._surface
+        surface.fill((0, 0, 0, 0))
+        pygame.draw.rect(surface, (15, 15, 35, 200), (0, 0, width, height), border_radius=8)
+        pygame.draw.rect(surface, (50, 200, 255), (0, 0, width, height), 2, border_radius=8)
+        surface.blit(render_text("Latency (ms)   p50 / p95 / p99", 14, (100, 255, 255)), (12, 10))
+
+        hist_x, hist_w = width - 12 - bins * 3, bins * 3
+        for i, stage in enumerate(self.stages):
+            y = 36 + i * 24
+            p = self.percentiles(stage)
+            text = f"{stage:<8} " + (" / ".join(f"{v:.1f}" for v in p) if p else "-")
+            surface.blit(render_text(text, 14, (220, 220, 255)), (12, y))
+            if p is None: continue
+            counts, _ = np.histogram(self.samples(stage), bins=bins, range=(0, max(p[2], 1e-3)))
+            scale = 18 / max(counts.max(), 1)
+            for b, n in enumerate(counts):
+                if n: pygame.draw.rect(surface, (50, 200, 255), (hist_x + b * 3, y + 18 - int(n * scale), 2, max(int(n * scale), 1)))
+            pygame.draw.line(surface, (80, 80, 120), (hist_x, y + 18), (hist_x + hist_w, y + 18))
+        return surface
+
+PROFILE_SECTIONS = ('input', 'tracker', 'ai', 'rules', 'particles', 'draw', 'flip')
+
+class FrameProfiler:
+    # Cộng dồn thời gian các đoạn `with profiler.section(name)` trong một khung hình, end_frame() chốt lại.
+    # Bảng phủ lấy trung bình `window` khung gần nhất; dump() ghi tối đa `keep` khung gần nhất ra CSV/JSON.
+    def __init__(self, sections=PROFILE_SECTIONS, window=120, keep=36000):
+        self.sections, self.window = sections, window
+        self.recent = np.zeros((window, len(sections))) # ms
+        self.frames = 0
+        self.rows = deque(maxlen=keep) # (số tick luật chơi, [ms theo từng đoạn])
+        self.visible = False
+        self._current = dict.fromkeys(sections, 0.0)
+        self._surface = None
+
+    @contextmanager
+    def section(self, name):
+        start = time.perf_counter()
+        try: yield
+        finally: self._current[name] += time.perf_counter() - start
+
+    def end_frame(self, ticks=1):
+        values = [self._current[name] * 1000 for name in self.sections]
+        self.recent[self.frames % self.window] = values
+        self.rows.append((ticks, values))
+        self.frames += 1
+        self._current = dict.fromkeys(self.sections, 0.0)
+
+    def averages(self):
+        n = min(self.frames, self.window)
+        return self.recent[:n].mean(axis=0) if n else np.zeros(len(self.sections))
+
+    def dump(self, path):
+        # Đuôi .json: trung bình/p95 từng đoạn + từng khung hình; còn lại: CSV mỗi dòng một khung hình
+        if path.endswith('.json'):
+            values = np.array([row for _, row in self.rows]).reshape(-1, len(self.sections))
+            summary = {name: {'mean': float(values[:, i].mean()), 'p95': float(np.percentile(values[:, i], 95))}
+                       for i, name in enumerate(self.sections)} if len(values) else {}
+            frames = [{'ticks': ticks, **dict(zip(self.sections, row))} for ticks, row in self.rows]
+            with open(path, 'w') as f: json.dump({'summary': summary, 'frames': frames}, f, indent=2)
+            return
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(('ticks',) + self.sections + ('total',))
+            for ticks, row in self.rows: writer.writerow([ticks] + [f'{v:.3f}' for v in row] + [f'{sum(row):.3f}'])
+
+    def draw(self, extra=(), width=260):
+        # Mỗi đoạn một dòng: thời gian trung bình (ms) và thanh tỉ lệ so với ngân sách 16.7 ms của 60 fps
+        height = 50 + 20 * (len(self.sections) + len(extra))
+        if self._surface is None or self._surface.get_height() != height:
+            self._surface = pygame.Surface((width, height), pygame.SRCALPHA)
+        surface = self._surface
+        surface.fill((0, 0, 0, 0))
+        pygame.draw.rect(surface, (15, 15, 35, 200), (0, 0, width, height), border_radius=8)
+        pygame.draw.rect(surface, (50, 200, 255), (0, 0, width, height), 2, border_radius=8)
+        averages = self.averages()
+        surface.blit(render_text(f"Frame {averages.sum():.1f} ms", 14, (100, 255, 255)), (12, 10))
+        bar_x, bar_w = 130, width - 142
+        for i, (name, ms) in enumerate(zip(self.sections, averages)):
+            y = 34 + i * 20
+            surface.blit(render_text(f"{name:<9} {ms:5.2f}", 14, (220, 220, 255)), (12, y))
+            pygame.draw.rect(surface, (50, 200, 255), (bar_x, y + 4, max(int(bar_w * min(ms / 16.7, 1)), 1), 10))
+        for i, text in enumerate(extra):
+            surface.blit(render_text(text, 14, (220, 220, 255)), (12, 40 + (len(self.sections) + i) * 20))
+        return surface
@@ -0,0 +1,80 @@
+# particles.py
+# Hệ particle lưu bằng mảng NumPy (mỗi thuộc tính một mảng) trong một pool dung lượng cố định.
+# Cập nhật vector hóa, particle hết hạn bị dồn mảng một lượt, và mỗi particle được vẽ bằng một sprite
+# vuông dựng sẵn theo (màu, cỡ, mức alpha) nên không còn tạo Surface mới mỗi khung hình.
+# Chuyển động giữ nguyên như lớp Particle cũ: mỗi khung x += vx, y += vy, vy += 0.2 (tính theo khung hình),
+# alpha giảm (255 / lifetime) * dt và particle biến mất khi lifetime <= 0.
+import numpy as np
+import pygame
+
+class ParticlePool:
+    def __init__(self, capacity=4096, alpha_step=8, seed=None):
+        self.capacity, self.alpha_step = capacity, alpha_step
+        self.x, self.y = np.zeros(capacity), np.zeros(capacity)
+        self.vx, self.vy = np.zeros(capacity), np.zeros(capacity)
+        self.alpha, self.lifetime = np.zeros(capacity), np.zeros(capacity)
+        self.size = np.zeros(capacity, dtype=np.int64)
+        self.color = np.zeros(capacity, dtype=np.int64) # Chỉ số trong self.palette
+        self.count, self.dropped = 0, 0 # dropped: số particle bị bỏ vì pool đã đầy
+        self.palette, self._color_index = [], {}
+        self._sprites = {}
+        self.rng = np.random.default_rng(seed)
+
+    def __len__(self): return self.count
+
+    def clear(self): self.count = 0
+
+    def emit(self, x, y, color, n=1):
+        # x, y: số hoặc mảng n phần tử; mọi particle trong một lần emit có cùng màu
+        n_free = min(n, self.capacity - self.count)
+        self.dropped += n - n_free
+        if n_free <= 0: return
+        if color not in self._color_index:
+            self._color_index[color] = len(self.palette)
+            self.palette.append(color)
+        i, rng = slice(self.count, self.count + n_free), self.rng
+        self.x[i] = np.broadcast_to(x, n)[:n_free]
+        self.y[i] = np.broadcast_to(y, n)[:n_free]
+        self.vx[i], self.vy[i] = rng.uniform(-4, 4, n_free), rng.uniform(-6, 2, n_free)
+        self.alpha[i], self.size[i] = 255, rng.integers(3, 8, n_free)
+        self.lifetime[i] = rng.uniform(0.4, 0.8, n_free)
+        self.color[i] = self._color_index[color]
+        self.count += n_free
+
+    def update(self, dt):
+        n = self.count
+        if not n: return
+        self.x[:n] += self.vx[:n]
+        self.y[:n] += self.vy[:n]
+        self.vy[:n] += 0.2
+        self.alpha[:n] -= 255 / self.lifetime[:n] * dt
+        self.lifetime[:n] -= dt
+        alive = self.lifetime[:n] > 0
+        if alive.all(): return
+        # Dồn các particle còn sống lên đầu mảng
+        k = int(alive.sum())
+        for field in (self.x, self.y, self.vx, self.vy, self.alpha, self.lifetime, self.size, self.color):
+            field[:k] = field[:n][alive]
+        self.count = k
+
+    def sprite(self, color, size, alpha):
+        key = (color, size, alpha)
+        sprite = self._sprites.get(key)
+        if sprite is None:
+            sprite = self._sprites[key] = pygame.Surface((size, size), pygame.SRCALPHA)
+            sprite.fill((*self.palette[color], alpha))
+        return sprite
+
+    def draw(self, surface):
+        # Trả về Rect bao các particle đã vẽ (None nếu không vẽ gì) để dùng làm vùng bẩn
+        n = self.count
+        levels = self.alpha[:n].astype(np.int64) // self.alpha_step * self.alpha_step
+        visible = np.nonzero(levels > 0)[0]
+        if not len(visible): return None
+        xs, ys = self.x[visible].astype(np.int64), self.y[visible].astype(np.int64)
+        sizes, sprite = self.size[visible], self.sprite
+        surface.blits([(sprite(c, s, a), (px, py)) for c, s, a, px, py in
+                       zip(self.color[visible].tolist(), sizes.tolist(), levels[visible].tolist(), xs.tolist(), ys.tolist())], doreturn=False)
+        left, top = int(xs.min()), int(ys.min())
+        bounds = pygame.Rect(left, top, int((xs + sizes).max()) - left, int((ys + sizes).max()) - top)
+        return bounds.clip(surface.get_rect()) or None
@@ -0,0 +1,134 @@
+# render.py
+# Tài nguyên vẽ dùng chung cho main.py, hand_control.py và metrics.py.
+# Font chỉ được nạp một lần cho mỗi cỡ chữ; chữ đã render được giữ trong bộ đệm LRU theo (nội dung, cỡ, màu),
+# nên điểm số, nhãn và menu chỉ render lại khi nội dung thay đổi.
+from collections import OrderedDict
+import pygame
+
+FONT_FILE = "Roboto-Regular.ttf"
+_fonts = {}
+
+def get_font(size, path=FONT_FILE):
+    key = (path, size)
+    font = _fonts.get(key)
+    if font is None: font = _fonts[key] = pygame.font.Font(path, size)
+    return font
+
+class TextCache:
+    # Surface trả về được dùng chung giữa các lần gọi: chỉ blit, không vẽ đè hay set_alpha trực tiếp lên nó
+    def __init__(self, max_size=256):
+        self.max_size = max_size
+        self.surfaces = OrderedDict()
+        self.hits, self.misses = 0, 0
+
+    def render(self, text, size, color):
+        key = (text, size, tuple(int(c) for c in color))
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+            return surface
+        self.misses += 1
+        surface = self.surfaces[key] = get_font(size).render(text, True, key[2])
+        if len(self.surfaces) > self.max_size: self.surfaces.popitem(last=False)
+        return surface
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def reset_stats(self): self.hits, self.misses = 0, 0
+
+text_cache = TextCache()
+
+def render_text(text, size, color): return text_cache.render(text, size, color)
+
+# --- VẼ THEO LỚP VÀ VÙNG BẨN ---
+# Khung hình = nền lưới cuộn (một tấm vẽ sẵn) + các Layer tĩnh (panel, bảng đã khóa) + lớp động nhỏ
+# (khối đang rơi, hiệu ứng, chữ) do nơi gọi tự vẽ. Giữa hai khung chỉ khôi phục và đẩy lên màn hình
+# những vùng lớp động vừa chiếm/rời đi và các Layer vừa đổi; cả màn hình chỉ vẽ lại khi nền cuộn sang pixel mới.
+class ScrollingGrid:
+    # Tấm nền lớn hơn màn hình một ô lưới; dịch tấm theo offset cho kết quả giống hệt vẽ lại từng đường kẻ
+    def __init__(self, size, spacing, color, background):
+        width, height = size
+        self.spacing = spacing
+        self.surface = pygame.Surface((width + spacing, height + spacing)).convert()
+        self.surface.fill(background)
+        for y in range(0, height + spacing, spacing): pygame.draw.line(self.surface, color, (0, y), (width + spacing, y))
+        for x in range(0, width + spacing, spacing): pygame.draw.line(self.surface, color, (x, 0), (x, height + spacing))
+
+    def shift(self, offset): return int(offset) % self.spacing
+
+    def draw(self, target, offset, rect=None):
+        s = self.spacing - self.shift(offset)
+        if rect is None: target.blit(self.surface, (-s, -s))
+        else: target.blit(self.surface, rect, rect.move(s, s))
+
+class StaticBackground:
+    # Nền cố định (surface vẽ sẵn, không cuộn) cùng giao diện với ScrollingGrid, cho LayeredRenderer vẽ lên một surface riêng
+    def __init__(self, surface): self.surface = surface
+    def shift(self, offset): return 0
+
+    def draw(self, target, offset, rect=None):
+        if rect is None: target.blit(self.surface, (0, 0))
+        else: target.blit(self.surface, rect, rect)
+
+def scale_region(source, target, rect, scale):
+    # Thu nhỏ riêng vùng rect của source vào vị trí tương ứng trên target; scale là Fraction p/q và kích thước source chia hết
+    # cho q. Vùng được nới ra tới bội của q nên mỗi điểm ảnh lấy đúng mẫu như khi pygame.transform.scale cả tấm.
+    p, q = scale.numerator, scale.denominator
+    left, top = rect.left // q * q, rect.top // q * q
+    area = pygame.Rect(left, top, -(-rect.right // q) * q - left, -(-rect.bottom // q) * q - top).clip(source.get_rect())
+    if not area: return
+    size = (area.w * p // q, area.h * p // q)
+    pygame.transform.scale(source.subsurface(area), size, target.subsurface(((area.x * p // q, area.y * p // q), size)))
+
+class Layer:
+    # Surface vẽ sẵn đặt cố định trên màn hình; đặt dirty=True sau khi vẽ lại nội dung
+    def __init__(self, surface, pos):
+        self.surface, self.rect, self.dirty = surface, surface.get_rect(topleft=pos), True
+
+class LayeredRenderer:
+    # display=False: screen là surface thường (ví dụ tấm vẽ một bảng), end() không đẩy gì lên màn hình.
+    # end() trả về các vùng đã đổi của khung này.
+    def __init__(self, screen, background, display=True):
+        self.screen, self.background, self.display = screen, background, display
+        self._previous, self._shift, self._full = [], None, True
+        self._offset, self._layers, self._dirty = 0, [], []
+        self.full_frames, self.partial_frames, self.updated_pixels = 0, 0, 0 # Số liệu cho profiler
+
+    def invalidate(self): self._full = True # Ví dụ khi cửa sổ bị che rồi hiện lại
+
+    def _restore(self, rect):
+        self.background.draw(self.screen, self._offset, rect)
+        for layer in self._layers:
+            clip = rect.clip(layer.rect)
+            if clip: self.screen.blit(layer.surface, clip, clip.move(-layer.rect.x, -layer.rect.y))
+
+    def begin(self, offset, layers):
+        # Dựng lại phần tĩnh dưới lớp động; sau đó nơi gọi vẽ lớp động rồi gọi end() với các Rect đã vẽ
+        self._offset, self._layers = offset, layers
+        shift = self.background.shift(offset)
+        if self._full or shift != self._shift:
+            self._full, self._shift, self._dirty = True, shift, []
+            self.background.draw(self.screen, offset)
+            for layer in layers: self.screen.blit(layer.surface, layer.rect)
+        else:
+            self._dirty = self._previous + [layer.rect for layer in layers if layer.dirty]
+            for rect in self._dirty: self._restore(rect)
+        for layer in layers: layer.dirty = False
+
+    def end(self, rects):
+        rects = [rect for rect in rects if rect]
+        if self._full:
+            dirty = [self.screen.get_rect()]
+            self._full = False
+            self.full_frames += 1
+        else:
+            dirty = self._dirty + rects
+            self.partial_frames += 1
+        if self.display: pygame.display.update(dirty)
+        self.updated_pixels = sum(rect.w * rect.h for rect in dirty)
+        self._previous = rects
+        return dirty
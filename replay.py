@@ -0,0 +1,95 @@
+# replay.py
+# Ghi ván chơi thành log nhị phân gọn (seed + các sự kiện) và phát lại không cần màn hình.
+# Định dạng: b"TTRP", phiên bản (1 byte), mode bộ sinh khối (1 byte), seed (varint),
+# rồi mỗi sự kiện là một varint ((số khung hình kể từ sự kiện trước) << 3 | mã sự kiện).
+# Ví dụ: python replay.py replays/game.ttr --repeat 100
+import argparse
+import os
+import time
+from engine import TetrisEngine, PieceGenerator
+
+MAGIC, VERSION = b"TTRP", 1
+MODES = ('uniform', 'bag')
+ACTION_BITS = 3
+
+def write_varint(buf, value):
+    while value >= 0x80:
+        buf.append((value & 0x7F) | 0x80)
+        value >>= 7
+    buf.append(value)
+
+def read_varint(data, pos):
+    value, shift = 0, 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80: return value, pos
+        shift += 7
+
+class Recorder:
+    def __init__(self, generator):
+        self.data = bytearray(MAGIC)
+        self.data += bytes((VERSION, MODES.index(generator.mode)))
+        write_varint(self.data, generator.seed)
+        self.last_frame = 0
+
+    def record(self, frame, action):
+        write_varint(self.data, ((frame - self.last_frame) << ACTION_BITS) | action)
+        self.last_frame = frame
+
+    def save(self, path):
+        with open(path, "wb") as f: f.write(self.data)
+
+def new_recorded_game(game_cls=TetrisEngine, mode='uniform', **kwargs):
+    generator = PieceGenerator(mode=mode)
+    return game_cls(generator=generator, recorder=Recorder(generator), **kwargs)
+
+def save_game(game, directory, prefix="game"):
+    # Lưu bản ghi của một ván (nếu có) vào thư mục, trả về đường dẫn file
+    if game.recorder is None: return None
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{prefix}-{time.strftime('%Y%m%d-%H%M%S')}-{game.generator.seed}.ttr")
+    game.recorder.save(path)
+    return path
+
+def load(data):
+    if data[:4] != MAGIC: raise ValueError("Not a Tetris replay file")
+    if data[4] != VERSION: raise ValueError(f"Unsupported replay version: {data[4]}")
+    mode = MODES[data[5]]
+    seed, pos = read_varint(data, 6)
+    events, frame = [], 0
+    while pos < len(data):
+        value, pos = read_varint(data, pos)
+        frame += value >> ACTION_BITS
+        events.append((frame, value & ((1 << ACTION_BITS) - 1)))
+    return seed, mode, events
+
+def play(data, game_cls=TetrisEngine, **kwargs):
+    # Phát lại toàn bộ sự kiện nhanh nhất có thể, bỏ qua thời gian thực
+    seed, mode, events = load(data)
+    game = game_cls(generator=PieceGenerator(seed, mode), **kwargs)
+    for frame, action in events:
+        game.frame = frame
+        game.apply(action)
+    return game
+
+def main():
+    parser = argparse.ArgumentParser(description="Phát lại bản ghi ván Tetris không cần màn hình")
+    parser.add_argument("path")
+    parser.add_argument("--repeat", type=int, default=1, help="số lần phát lại (để đo hiệu năng)")
+    parser.add_argument("--fps", type=int, default=60, help="tốc độ khung hình lúc ghi, để so với thời gian thực")
+    args = parser.parse_args()
+
+    with open(args.path, "rb") as f: data = f.read()
+    start = time.perf_counter()
+    for _ in range(args.repeat): game = play(data)
+    elapsed = (time.perf_counter() - start) / args.repeat
+
+    real_time = game.frame / args.fps
+    print(f"score {game.score}, lines {game.lines}, pieces {game.pieces}, game over {game.game_over}")
+    print(f"{len(data)} bytes, {game.frame} frames ({real_time:.1f}s at {args.fps} fps) replayed in {elapsed * 1000:.2f}ms"
+          + (f" ({real_time / elapsed:.0f}x real time)" if elapsed > 0 and game.frame else ""))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+# tune.py
+# Dò trọng số cho evaluate_board bằng phương pháp cross-entropy: mỗi thế hệ chạy song song nhiều ván AI
+# không màn hình (cùng bộ seed cho mọi ứng viên) trên tất cả các nhân CPU bằng process pool.
+# Mỗi thế hệ chơi một bộ seed khác và ít ván nên điểm giữa các thế hệ không so được với nhau; trọng số được ghi ra
+# là ứng viên (tốt nhất thế hệ hoặc trung bình CE mới) có điểm cao nhất trên một bộ seed kiểm tra cố định (--holdout-games).
+# Ví dụ: python tune.py --generations 20 --population 32 --games 8
+#        python tune.py --resume      # chạy tiếp từ checkpoint
+import argparse
+import json
+import math
+import os
+import random
+import statistics
+import time
+from multiprocessing import Pool
+import ai
+from engine import PieceGenerator
+from headless import play_game
+
+CHECKPOINT_FILE = "tune_checkpoint.json"
+
+def run_games(task):
+    # Chạy trong tiến trình con: đặt trọng số của ứng viên rồi chơi các ván theo seed
+    weights, seeds, max_pieces = task
+    ai.WEIGHTS[:] = weights
+    start, lines = time.perf_counter(), 0
+    for seed in seeds:
+        lines += play_game(max_pieces, ai.find_best_move_incremental, PieceGenerator(seed)).lines
+    return lines / len(seeds), len(seeds), time.perf_counter() - start, os.getpid()
+
+def score_holdout(pool, candidates, seeds, max_pieces):
+    # Điểm (số hàng trung bình) của từng ứng viên trên bộ seed kiểm tra, mỗi ván là một tác vụ để chia đều cho các tiến trình
+    results = pool.map(run_games, [(w, [seed], max_pieces) for w in candidates for seed in seeds], chunksize=1)
+    return [statistics.fmean(r[0] for r in results[i * len(seeds):(i + 1) * len(seeds)]) for i in range(len(candidates))]
+
+def normalize(weights):
+    # Bộ đánh giá không đổi khi nhân trọng số với một hằng dương, nên giữ vector có độ dài 1
+    norm = math.sqrt(sum(w * w for w in weights)) or 1.0
+    return [w / norm for w in weights]
+
+def save_checkpoint(state, path):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f: json.dump(state, f, indent=2)
+    os.replace(tmp, path)
+
+def main():
+    parser = argparse.ArgumentParser(description="Dò trọng số AI Tetris bằng cross-entropy trên process pool")
+    parser.add_argument("--generations", type=int, default=20)
+    parser.add_argument("--population", type=int, default=32)
+    parser.add_argument("--elite", type=float, default=0.25, help="tỉ lệ ứng viên tốt nhất giữ lại mỗi thế hệ")
+    parser.add_argument("--games", type=int, default=8, help="số ván cho mỗi ứng viên")
+    parser.add_argument("--holdout-games", type=int, default=16, help="số ván trên bộ seed kiểm tra cố định dùng để chọn trọng số ghi ra")
+    parser.add_argument("--max-pieces", type=int, default=500)
+    parser.add_argument("--noise", type=float, default=0.1, help="nhiễu cộng thêm vào độ lệch chuẩn, giảm dần theo thế hệ")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--checkpoint", default=CHECKPOINT_FILE)
+    parser.add_argument("--resume", action="store_true")
+    parser.add_argument("--output", default=ai.WEIGHTS_FILE, help="file trọng số để TetrisAI nạp khi khởi động")
+    args = parser.parse_args()
+
+    if args.resume and os.path.exists(args.checkpoint):
+        with open(args.checkpoint) as f: state = json.load(f)
+        print(f"Resuming from generation {state['generation']} ({args.checkpoint})")
+        if state.get("holdout") != [args.seed, args.holdout_games]:
+            state["best_fitness"] = None # Điểm cũ đo trên bộ seed kiểm tra khác (hoặc trên seed của một thế hệ): không so được
+        state.setdefault("best_generation", state["generation"] - 1 if state["generation"] else None)
+    else:
+        state = {"generation": 0, "mean": normalize(ai.WEIGHTS), "std": [0.2] * len(ai.WEIGHTS),
+                 "best_weights": normalize(ai.WEIGHTS), "best_fitness": None, "best_generation": None, "history": []}
+    state["holdout"] = [args.seed, args.holdout_games]
+    holdout_rng = random.Random(f"holdout-{args.seed}")
+    holdout = [holdout_rng.randrange(2**31) for _ in range(args.holdout_games)]
+
+    n_elite = max(2, int(args.population * args.elite))
+    with Pool(args.workers) as pool:
+        if state["best_fitness"] is None and state["generation"] < args.generations:
+            # Trọng số xuất phát cũng là một ứng viên: chỉ ghi đè weights.json khi CE tìm được bộ tốt hơn trên bộ seed kiểm tra
+            state["best_fitness"] = score_holdout(pool, [state["best_weights"]], holdout, args.max_pieces)[0]
+            print(f"start weights: {state['best_fitness']:.1f} holdout lines")
+        while state["generation"] < args.generations:
+            gen = state["generation"]
+            rng = random.Random(args.seed * 1000003 + gen)
+            population = [normalize([rng.gauss(m, s) for m, s in zip(state["mean"], state["std"])]) for _ in range(args.population)]
+            seeds = [rng.randrange(2**31) for _ in range(args.games)]
+
+            start = time.perf_counter()
+            results = pool.map(run_games, [(w, seeds, args.max_pieces) for w in population], chunksize=1)
+            elapsed = time.perf_counter() - start
+
+            worker_stats = {}
+            for _, games, seconds, pid in results:
+                stats = worker_stats.setdefault(pid, [0, 0.0])
+                stats[0], stats[1] = stats[0] + games, stats[1] + seconds
+
+            ranked = sorted(zip((r[0] for r in results), population), key=lambda p: -p[0])
+            elite = [w for _, w in ranked[:n_elite]]
+            state["mean"] = [statistics.fmean(col) for col in zip(*elite)]
+            state["std"] = [statistics.pstdev(col) + args.noise / (gen + 1) for col in zip(*elite)]
+            best_fitness, best_weights = ranked[0]
+            candidates = [best_weights, normalize(state["mean"])]
+            holdout_scores = score_holdout(pool, candidates, holdout, args.max_pieces)
+            for score, weights in zip(holdout_scores, candidates):
+                if score > state["best_fitness"]:
+                    state["best_fitness"], state["best_weights"], state["best_generation"] = score, weights, gen
+            state["history"].append({"generation": gen, "best": best_fitness, "mean_fitness": statistics.fmean(r[0] for r in results),
+                                     "holdout_best": holdout_scores[0], "holdout_mean": holdout_scores[1], "seconds": elapsed})
+            state["generation"] = gen + 1
+            save_checkpoint(state, args.checkpoint)
+            if state["best_generation"] == gen: ai.save_weights(state["best_weights"], args.output)
+
+            total_games = len(population) * args.games
+            print(f"gen {gen}: best {best_fitness:.1f} lines, mean {state['history'][-1]['mean_fitness']:.1f}, "
+                  f"{total_games / elapsed:.1f} games/sec total, weights {[round(w, 3) for w in best_weights]}")
+            print(f"  holdout: best {holdout_scores[0]:.1f} lines, CE mean {holdout_scores[1]:.1f} lines (kept {state['best_fitness']:.1f})")
+            for pid, (games, seconds) in sorted(worker_stats.items()):
+                print(f"  worker {pid}: {games} games, {games / seconds:.1f} games/sec")
+
+    if state["best_fitness"] is None: print(f"No generation was run, {args.output} left unchanged")
+    elif state["best_generation"] is None: print(f"Start weights ({state['best_fitness']:.1f} holdout lines) were not beaten, {args.output} left unchanged")
+    else: print(f"Best weights {state['best_weights']} ({state['best_fitness']:.1f} holdout lines) -> {args.output}")
+
+if __name__ == "__main__":
+    main()